@@ -1,17 +1,64 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-import os
+import asyncio
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from settings import get_settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+@lru_cache(maxsize=None)
+def pwd_context():
+    # passlib and the bcrypt backend are loaded on the first hash, not at
+    # import, so workers that never see a login start faster.
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__rounds=settings.bcrypt_rounds,
+    )
 
 def get_password_hash(password):
-    return pwd_context.hash(password[:72])
+    return pwd_context().hash(password[:72])
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+def verify_and_update_password(plain_password, hashed_password):
+    # Returns (valid, new_hash); new_hash is set when the stored hash uses
+    # fewer rounds than BCRYPT_ROUNDS and should be written back.
+    return pwd_context().verify_and_update(plain_password, hashed_password)
+
+# bcrypt releases the GIL, so a small thread pool gives real parallelism
+# while keeping the event loop free. Requests beyond workers + queue limit
+# are shed with a 503 rather than queueing without bound.
+PASSWORD_HASH_WORKERS = settings.password_hash_workers
+PASSWORD_HASH_QUEUE_LIMIT = settings.password_hash_queue_limit
+
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_password_jobs = 0
+
+async def run_password_job(func, *args):
+    global _password_jobs
+    if _password_jobs >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _password_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        _password_jobs -= 1
 
 import uuid
 
@@ -22,43 +69,152 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire, "jti": str(uuid.uuid4())})
-    encoded_jwt = jwt.encode(to_encode, os.getenv("JWT_SECRET_KEY"), algorithm=os.getenv("ALGORITHM"))
+    encoded_jwt = jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-from pymongo import MongoClient
+from database import get_db
+from cache import TTLCache
+from metrics import span
+
+# Per-worker caches; revocations and tier changes made on this worker are
+# applied immediately, other workers pick them up once the TTL lapses.
+user_cache = TTLCache(
+    maxsize=settings.user_cache_max_size,
+    ttl=settings.user_cache_ttl_seconds,
+)
+blocklist_cache = TTLCache(
+    maxsize=settings.blocklist_cache_max_size,
+    ttl=settings.blocklist_cache_ttl_seconds,
+)
+# Verified claims keyed by a hash of the token; entries never outlive "exp".
+token_cache = TTLCache(
+    maxsize=settings.token_cache_max_size,
+    ttl=settings.token_cache_ttl_seconds,
+)
+
+class BlocklistSnapshot:
+    # In-memory set of the jtis revoked and not yet expired, refreshed from
+    # token_blocklist in the background. While it is fresher than
+    # max_staleness the common "not revoked" answer needs no query.
+    def __init__(self, refresh_seconds: float, max_staleness: float):
+        self.refresh_seconds = refresh_seconds
+        self.max_staleness = max_staleness
+        self.jtis = set()
+        self.refreshed_at = None
+        self._local = set()
+        self._task = None
+
+    def is_fresh(self):
+        return self.refreshed_at is not None and time.monotonic() - self.refreshed_at <= self.max_staleness
+
+    def add(self, jti: str):
+        self.jtis.add(jti)
+        self._local.add(jti)
+
+    async def refresh(self, db):
+        started = time.monotonic()
+        self._local = set()
+        jtis = set()
+        cursor = db.get_collection("token_blocklist").find(
+            {"expires_at": {"$gt": datetime.utcnow()}}, {"jti": 1}
+        )
+        async for entry in cursor:
+            jtis.add(entry["jti"])
+        # Keep local revocations made while the query was running
+        self.jtis = jtis | self._local
+        self.refreshed_at = started
 
-def is_token_blocklisted(jti: str):
-    client = MongoClient(os.getenv("MONGODB_URI"))
-    db = client.get_database("resume_pivot")
-    blocklist_collection = db.get_collection("token_blocklist")
-    return blocklist_collection.find_one({"jti": jti}) is not None
+    async def _run(self, db):
+        while True:
+            try:
+                await self.refresh(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Could not refresh the token blocklist: %s", e)
+            await asyncio.sleep(self.refresh_seconds)
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+    def start(self, db):
+        if self.refresh_seconds > 0:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+blocklist_snapshot = BlocklistSnapshot(
+    refresh_seconds=settings.blocklist_refresh_seconds,
+    max_staleness=settings.blocklist_max_staleness_seconds,
+)
+
+def invalidate_user(email: str):
+    user_cache.invalidate(email)
+
+def mark_token_blocklisted(jti: str):
+    blocklist_snapshot.add(jti)
+    blocklist_cache.set(jti, True)
+
+def cache_stats():
+    return {"user": user_cache.stats(), "blocklist": blocklist_cache.stats(), "token": token_cache.stats()}
+
+async def is_token_blocklisted(db, jti: str):
+    if blocklist_snapshot.is_fresh():
+        return jti in blocklist_snapshot.jtis
+
+    blocklisted = blocklist_cache.get(jti)
+    if blocklisted is None:
+        blocklist_collection = db.get_collection("token_blocklist")
+        blocklisted = await blocklist_collection.find_one({"jti": jti}) is not None
+        blocklist_cache.set(jti, blocklisted)
+    return blocklisted
+
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: str):
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    payload = token_cache.get(cache_key)
+    if payload is None:
+        with span("jwt_decode"):
+            payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.algorithm])
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            token_cache.set(cache_key, payload, ttl=min(token_cache.ttl, remaining))
+    return payload
+
+async def get_token_payload(token: str = Depends(oauth2_scheme)):
+    # FastAPI resolves a dependency once per request, so get_current_user and
+    # handlers such as logout share this single decode.
     try:
-        payload = jwt.decode(token, os.getenv("JWT_SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")])
-        email: str = payload.get("sub")
-        jti: str = payload.get("jti")
-        if email is None or jti is None:
-            raise credentials_exception
-        if is_token_blocklisted(jti):
-            raise credentials_exception
+        return decode_token(token)
     except JWTError:
-        raise credentials_exception
-    
-    client = MongoClient(os.getenv("MONGODB_URI"))
-    db = client.get_database("resume_pivot")
-    users_collection = db.get_collection("users")
-    
-    user = users_collection.find_one({"email": email})
+        raise credentials_exception()
+
+async def get_current_user(payload: dict = Depends(get_token_payload), db = Depends(get_db)):
+    email: str = payload.get("sub")
+    jti: str = payload.get("jti")
+    if email is None or jti is None:
+        raise credentials_exception()
+    with span("blocklist_lookup"):
+        blocklisted = await is_token_blocklisted(db, jti)
+    if blocklisted:
+        raise credentials_exception()
     
+    user = user_cache.get(email)
     if user is None:
-        raise credentials_exception
+        users_collection = db.get_collection("users")
+        with span("user_fetch"):
+            user = await users_collection.find_one({"email": email})
+        if user is None:
+            raise credentials_exception()
+        user_cache.set(email, user)
     
-    return user
\ No newline at end of file
+    return dict(user)
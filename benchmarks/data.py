@@ -0,0 +1,49 @@
+import random
+import fitz  # PyMuPDF
+
+COMPANIES = ["ACME CORP", "GLOBEX", "INITECH", "UMBRELLA", "HOOLI", "STARK INDUSTRIES"]
+TITLES = ["Senior Engineer", "Product Manager", "Backend Developer", "Data Analyst", "Team Lead"]
+WORDS = (
+    "python backend api developer software product roadmap feature agile payment "
+    "inventory fintech financial platform service latency team led built designed "
+    "scaled migrated reduced improved customers data pipeline analytics"
+).split()
+
+def sentence(rng, low=6, high=16):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + "."
+
+def synthetic_resume(roles: int, seed: int = 0):
+    # Laid out the way parse_experience expects: an EXPERIENCE header, upper
+    # case company lines, then title / date range / description per role.
+    rng = random.Random(seed)
+    lines = ["Jane Doe", "jane@example.com", "", "Summary", sentence(rng), "", "EXPERIENCE"]
+    remaining = roles
+    while remaining > 0:
+        lines.append(rng.choice(COMPANIES))
+        for _ in range(min(remaining, rng.randint(1, 3))):
+            lines.append(rng.choice(TITLES))
+            lines.append(f"Jan {rng.randint(2000, 2020)} – Dec {rng.randint(2021, 2024)}")
+            lines.extend(sentence(rng) for _ in range(rng.randint(2, 5)))
+            remaining -= 1
+    lines += ["Projects", sentence(rng)]
+    return "\n".join(lines)
+
+def make_pdf(text: str, lines_per_page: int = 60):
+    # TextWriter embeds a Unicode font, so the en dashes in date ranges
+    # survive extraction.
+    document = fitz.open()
+    font = fitz.Font("helv")
+    lines = text.splitlines()
+    for start in range(0, len(lines), lines_per_page):
+        page = document.new_page()
+        writer = fitz.TextWriter(page.rect)
+        for offset, line in enumerate(lines[start:start + lines_per_page]):
+            writer.append((40, 40 + offset * 12), line, font=font, fontsize=9)
+        writer.write_text(page)
+    data = document.tobytes()
+    document.close()
+    return data
+
+def job_description(seed: int = 0):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(40))
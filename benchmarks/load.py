@@ -0,0 +1,133 @@
+from collections import defaultdict
+import argparse
+import asyncio
+import os
+import time
+import httpx
+from benchmarks.data import job_description, make_pdf, synthetic_resume
+
+# Drives register / login / upload / version generation / listing traffic
+# against the FastAPI app and reports throughput and latency percentiles
+# per route. By default the app runs in-process against an in-memory Mongo
+# stand-in; pass --mongo-uri to use a real (local) mongod, or --url to
+# target an already running server.
+#
+# Every virtual user comes from the same client IP, so the per-IP register
+# and login limits would reject most of them. In-process runs disable rate
+# limiting; start a server targeted with --url with RATE_LIMIT_ENABLED=false.
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, client, route, method, url, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[route].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[route] += 1
+        return response
+
+    def report(self, elapsed):
+        total = sum(len(values) for values in self.latencies.values())
+        print(f"{total} requests in {elapsed:.2f}s ({total / elapsed:.1f} req/s)")
+        print(f"{'route':<28} {'count':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            print(
+                f"{route:<28} {len(values):>6} {self.errors[route]:>6} {len(values) / elapsed:>8.1f} "
+                f"{percentile(values, 0.50) * 1000:>8.1f} {percentile(values, 0.95) * 1000:>8.1f} "
+                f"{percentile(values, 0.99) * 1000:>8.1f}"
+            )
+
+async def virtual_user(client, recorder, user_no, resume_pdf, args):
+    username = f"bench{user_no}"
+    await recorder.request(
+        client, "POST /auth/register", "POST", "/api/v1/auth/register",
+        json={"username": username, "email": f"{username}@example.com", "password": "bench-password"},
+    )
+    response = await recorder.request(
+        client, "POST /auth/login", "POST", "/api/v1/auth/login",
+        data={"username": username, "password": "bench-password"},
+    )
+    if response.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    await recorder.request(
+        client, "POST /resumes/master", "POST", "/api/v1/resumes/master",
+        headers=headers, files={"file": ("resume.pdf", resume_pdf, "application/pdf")},
+    )
+    await recorder.request(
+        client, "POST /subscriptions/upgrade", "POST", "/api/v1/subscriptions/upgrade",
+        headers=headers, json={"tierId": "pro"},
+    )
+    for version_no in range(args.versions):
+        await recorder.request(
+            client, "POST /resumes/versions", "POST", "/api/v1/resumes/versions",
+            headers=headers,
+            json={"jobDescription": job_description(user_no * 1000 + version_no), "versionName": f"v{version_no}"},
+        )
+    for _ in range(args.reads):
+        await recorder.request(client, "GET /resumes/versions", "GET", "/api/v1/resumes/versions", headers=headers)
+        await recorder.request(client, "GET /resumes/master", "GET", "/api/v1/resumes/master", headers=headers)
+        await recorder.request(client, "GET /users/me", "GET", "/api/v1/users/me", headers=headers)
+
+async def run(args):
+    # Distinct resumes per user so the upload dedupe cache does not hide
+    # extraction cost.
+    resumes = [make_pdf(synthetic_resume(args.roles, seed)) for seed in range(min(args.users, 32))]
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        app = None
+    else:
+        os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+        os.environ.setdefault("ALGORITHM", "HS256")
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+        if args.mongo_uri:
+            os.environ["MONGODB_URI"] = args.mongo_uri
+        else:
+            import database
+            from benchmarks.mongo_stub import StubClient
+            os.environ.setdefault("MONGODB_URI", "mongodb://in-memory")
+            database.connect = lambda mongo_uri: setattr(database, "client", StubClient())
+        import main
+        app = main.app
+        await main.startup_db_client()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(user_no):
+        async with semaphore:
+            await virtual_user(client, recorder, user_no, resumes[user_no % len(resumes)], args)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(limited(user_no) for user_no in range(args.users)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await client.aclose()
+        if app is not None:
+            await main.shutdown_db_client()
+    recorder.report(elapsed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the resume API")
+    parser.add_argument("--users", type=int, default=50, help="virtual users to run")
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual users active at once")
+    parser.add_argument("--versions", type=int, default=3, help="versions generated per user")
+    parser.add_argument("--reads", type=int, default=5, help="list/read rounds per user")
+    parser.add_argument("--roles", type=int, default=20, help="experience entries per synthetic resume")
+    parser.add_argument("--mongo-uri", help="run in-process against this MongoDB instead of the in-memory stand-in")
+    parser.add_argument("--url", help="target a running server (started with RATE_LIMIT_ENABLED=false) instead of an in-process app")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,131 @@
+from starlette.datastructures import Headers, UploadFile
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+from benchmarks.data import job_description, make_pdf, synthetic_resume
+from experience_parser import parse_experience
+from experience_scoring import ExperienceIndex
+import extraction
+from ranking import build_index
+from resume import generate_version_ops
+import uploads
+from versions import apply_delta
+
+# Micro-benchmarks for the CPU-heavy steps of the upload and generation
+# paths over resumes of increasing size. Prints one table per step so
+# regressions show up in CI logs.
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def bench_parse_experience(sizes, repeat):
+    print(f"\nparse_experience\n{'roles':>6} {'chars':>8} {'ms':>9}")
+    for roles in sizes:
+        text = synthetic_resume(roles)
+        seconds = best_of(lambda: parse_experience(text), repeat)
+        print(f"{roles:>6} {len(text):>8} {seconds * 1000:>9.2f}")
+
+def bench_pdf_extraction(sizes, repeat):
+    print(f"\npdf extraction (process pool)\n{'roles':>6} {'pages':>6} {'ms':>9} {'ms/page':>8}")
+
+    async def extract_all():
+        for roles in sizes:
+            data = make_pdf(synthetic_resume(roles))
+            await extraction.extract_pdf_text(data)  # warm the pool
+            best = float("inf")
+            for _ in range(repeat):
+                pages_before = extraction.extraction_stats["pages"]
+                started = time.perf_counter()
+                await extraction.extract_pdf_text(data)
+                best = min(best, time.perf_counter() - started)
+            pages = extraction.extraction_stats["pages"] - pages_before
+            print(f"{roles:>6} {pages:>6} {best * 1000:>9.2f} {best * 1000 / max(pages, 1):>8.2f}")
+
+    try:
+        asyncio.run(extract_all())
+    finally:
+        extraction.shutdown()
+
+def bench_version_generation(sizes, repeat):
+    print(f"\nversion generation\n{'roles':>6} {'lines':>6} {'index ms':>9} {'generate ms':>12}")
+    query = job_description()
+    for roles in sizes:
+        text = synthetic_resume(roles)
+        lines = text.splitlines()
+        index_seconds = best_of(lambda: build_index(text), repeat)
+        index = build_index(text)
+        generate_seconds = best_of(
+            lambda: apply_delta(text, lines, generate_version_ops(index, query)), repeat
+        )
+        print(f"{roles:>6} {len(lines):>6} {index_seconds * 1000:>9.2f} {generate_seconds * 1000:>12.2f}")
+
+def bench_experience_scoring(sizes, repeat, batch=20):
+    # One job description at a time versus a batch scored in a single call
+    print(f"\nexperience scoring\n{'roles':>6} {'terms':>6} {'build ms':>9} {'1 jd ms':>8} {f'{batch} jds ms':>10} {'ms/jd':>7}")
+    queries = [job_description(seed) for seed in range(batch)]
+    for roles in sizes:
+        experience = parse_experience(synthetic_resume(roles))
+        build_seconds = best_of(lambda: ExperienceIndex(experience), repeat)
+        index = ExperienceIndex(experience)
+        single_seconds = best_of(lambda: index.rank(queries[:1]), repeat)
+        batch_seconds = best_of(lambda: index.rank(queries), repeat)
+        print(
+            f"{len(experience):>6} {len(index.vocabulary):>6} {build_seconds * 1000:>9.2f} {single_seconds * 1000:>8.2f}"
+            f" {batch_seconds * 1000:>10.2f} {batch_seconds * 1000 / batch:>7.2f}"
+        )
+
+def bench_upload_spooling(sizes, repeat):
+    # Peak Python heap allocated while consuming one upload, compared with
+    # reading it whole. The source is spooled like the ones Starlette parses
+    # multipart bodies into: in memory up to 1 MiB, then on disk.
+    print(f"\nupload spooling (peak memory)\n{'roles':>6} {'bytes':>9} {'peak KiB':>9} {'read() KiB':>10} {'on disk':>8}")
+
+    async def consume(data, spool):
+        source = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        source.write(data)
+        source.seek(0)
+        upload_file = UploadFile(source, size=len(data), headers=Headers({"content-type": "application/pdf"}))
+        tracemalloc.start()
+        try:
+            if spool:
+                upload = await uploads.spool_upload(upload_file)
+                on_disk = upload.path is not None
+                upload.cleanup()
+            else:
+                await upload_file.read()
+                on_disk = False
+            return tracemalloc.get_traced_memory()[1], on_disk
+        finally:
+            tracemalloc.stop()
+            source.close()
+
+    asyncio.run(consume(b"warm-up", True))
+    for roles in sizes:
+        data = make_pdf(synthetic_resume(roles))
+        spool_peak, on_disk = max(asyncio.run(consume(data, True)) for _ in range(repeat))
+        read_peak, _ = max(asyncio.run(consume(data, False)) for _ in range(repeat))
+        print(f"{roles:>6} {len(data):>9} {spool_peak / 1024:>9.1f} {read_peak / 1024:>10.1f} {'yes' if on_disk else 'no':>8}")
+
+BENCHMARKS = {
+    "parse": bench_parse_experience,
+    "pdf": bench_pdf_extraction,
+    "generate": bench_version_generation,
+    "experience": bench_experience_scoring,
+    "upload": bench_upload_spooling,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for resume processing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 80, 200], help="experience entries per resume")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), nargs="+", default=sorted(BENCHMARKS))
+    args = parser.parse_args()
+    for name in args.only:
+        BENCHMARKS[name](args.sizes, args.repeat)
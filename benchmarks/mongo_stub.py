@@ -0,0 +1,71 @@
+import mongomock
+
+# Minimal asyncio facade over mongomock so the app can run against an
+# in-memory database. Only the parts of the async driver API the app uses
+# are covered.
+
+class StubCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, limit):
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        return list(self._cursor)
+
+class StubCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return StubCursor(self._collection.find(*args, **kwargs))
+
+    async def aggregate(self, *args, **kwargs):
+        return StubCursor(self._collection.aggregate(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+class StubDatabase:
+    def __init__(self, db):
+        self._db = db
+
+    def get_collection(self, name):
+        return StubCollection(self._db.get_collection(name))
+
+    def __getitem__(self, name):
+        return self.get_collection(name)
+
+class StubAdmin:
+    async def command(self, *args, **kwargs):
+        return {"ok": 1.0}
+
+class StubClient:
+    def __init__(self):
+        self._client = mongomock.MongoClient()
+        self.admin = StubAdmin()
+
+    def get_database(self, name):
+        return StubDatabase(self._client.get_database(name))
+
+    async def close(self):
+        pass
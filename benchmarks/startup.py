@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Measures cold start: a fresh interpreter importing the app and running its
+# startup hook against the in-memory Mongo stand-in, which is what an
+# autoscaled or serverless worker pays before serving its first request.
+# Also lists the slowest imports (python -X importtime) and whether the
+# heavy optional modules were loaded at all.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["fitz", "passlib", "bcrypt", "numpy"]
+
+COLD_START = """
+import json, sys, time
+started = time.perf_counter()
+import database
+from benchmarks.mongo_stub import StubClient
+database.connect = lambda mongo_uri: setattr(database, "client", StubClient())
+import main
+imported = time.perf_counter()
+import asyncio
+async def startup():
+    await main.startup_db_client()
+    ready = time.perf_counter()
+    await main.shutdown_db_client()
+    return ready
+ready = asyncio.run(startup())
+print(json.dumps({
+    "import": imported - started,
+    "startup": ready - imported,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+    env.setdefault("MONGODB_URI", "mongodb://in-memory")
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+def cold_start():
+    result = subprocess.run(
+        [sys.executable, "-c", COLD_START], cwd=ROOT, env=child_env(),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def slowest_imports(top):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, env=child_env(),
+        capture_output=True, text=True, check=True,
+    )
+    # "import time: self [us] | cumulative | imported package"
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        entries.append((int(cumulative_us), int(self_us), name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure API cold start time")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    runs = [cold_start() for _ in range(args.repeat)]
+    imports = [run["import"] * 1000 for run in runs]
+    startups = [run["startup"] * 1000 for run in runs]
+    print(f"{'':<10} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for label, values in (("import", imports), ("startup", startups)):
+        print(f"{label:<10} {statistics.median(values):>10.1f} {min(values):>8.1f} {max(values):>8.1f}")
+    loaded = runs[-1]["loaded"]
+    print(f"heavy modules loaded at startup: {', '.join(loaded) if loaded else 'none'}")
+
+    slowest = slowest_imports(args.top)
+    print(f"\n{'cumulative ms':>13} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in slowest:
+        print(f"{cumulative_us / 1000:>13.1f} {self_us / 1000:>8.1f}  {name}")
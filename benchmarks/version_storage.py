@@ -0,0 +1,65 @@
+from bson import ObjectId, encode
+import argparse
+import random
+import time
+from ranking import build_index
+from resume import generate_version_ops
+from versions import apply_delta, make_delta
+
+# Compares full-copy and delta version storage: document size and the time
+# to materialise a version's text on read.
+
+WORDS = (
+    "python backend api developer software product roadmap feature agile payment "
+    "inventory fintech financial platform service latency team led built designed "
+    "scaled migrated reduced improved customers data pipeline analytics"
+).split()
+
+def synthetic_resume(lines: int, rng):
+    return "\n".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14)))
+        for _ in range(lines)
+    )
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+def run(sizes, versions, repeat, seed):
+    rng = random.Random(seed)
+    print(f"{'lines':>6} {'full bytes':>12} {'delta bytes':>12} {'ratio':>6} {'read us':>9}")
+    for size in sizes:
+        raw_text = synthetic_resume(size, rng)
+        master_lines = raw_text.splitlines()
+        index = build_index(raw_text)
+        snapshot_id = ObjectId()
+
+        full_bytes = delta_bytes = 0
+        ops_list = []
+        for _ in range(versions):
+            query = " ".join(rng.sample(WORDS, 5))
+            ops = generate_version_ops(index, query)
+            text = apply_delta(raw_text, master_lines, ops)
+            full_bytes += len(encode({"content": {"raw": text}}))
+            delta_bytes += len(encode({"content": make_delta(snapshot_id, ops)}))
+            ops_list.append(ops)
+
+        # Snapshot lines are cached, so a read is just the delta replay
+        read_seconds = timed(
+            lambda: [apply_delta(raw_text, master_lines, ops) for ops in ops_list], repeat
+        ) / versions
+        print(
+            f"{size:>6} {full_bytes:>12} {delta_bytes:>12} "
+            f"{full_bytes / delta_bytes:>6.1f} {read_seconds * 1e6:>9.1f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full-copy and delta version storage")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000, 5000])
+    parser.add_argument("--versions", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.versions, args.repeat, args.seed)
@@ -0,0 +1,33 @@
+from pymongo import AsyncMongoClient
+from metrics import MongoCommandListener
+from settings import get_settings
+
+DATABASE_NAME = "resume_pivot"
+
+client = None
+
+def connect(mongo_uri: str):
+    global client
+    settings = get_settings()
+    client = AsyncMongoClient(
+        mongo_uri,
+        maxPoolSize=settings.mongodb_max_pool_size,
+        minPoolSize=settings.mongodb_min_pool_size,
+        maxIdleTimeMS=settings.mongodb_max_idle_time_ms,
+        serverSelectionTimeoutMS=settings.mongodb_server_selection_timeout_ms,
+        event_listeners=[MongoCommandListener()],
+    )
+    return client
+
+async def close():
+    global client
+    if client is not None:
+        await client.close()
+        client = None
+
+def get_db():
+    # Shared by every router through Depends(get_db); all requests borrow
+    # connections from the single application-scoped pool.
+    if client is None:
+        raise RuntimeError("Database client is not initialised")
+    return client.get_database(DATABASE_NAME)
@@ -0,0 +1,59 @@
+import re
+import uuid
+import tagger
+from settings import get_settings
+
+SECTION_PATTERN = re.compile(r"(?i)(experience|work history|employment)")
+
+# Simple regex to find job title, company, and date range
+# This is a heuristic and may need to be improved
+# This regex is designed to find blocks of text that represent a single company's experience.
+#
+# Both patterns match what the original heuristics matched, but are written
+# so that no two adjacent quantifiers can share a run of whitespace: \s*+
+# is possessive, runs of [A-Z\s] are matched once, and "." is spelled
+# [^\n]. The originals backtracked polynomially on long whitespace runs (a
+# few KB of spaces took minutes); these stay linear.
+ENTRY_PATTERN = re.compile(
+    r'^([A-Z\s]{2,})\n([\s\S]+?)(?=\n[A-Z\s]{2,}\n|\n\s*+(?:Projects|Awards|Additional)\s*\n|\Z)',
+    re.MULTILINE
+)
+
+# This regex finds individual job roles within the company's block of text.
+# A title line followed by a date line containing "–"; when the date line is
+# the first non-blank line, the title is empty.
+ROLE_PATTERN = re.compile(
+    r'^(?:\s*+|(?>\s*(?=\n)))([^\n]*)\n\s*+([^\n]*–[^\n]*)\n([\s\S]+?)'
+    r'(?=\n\s*+[A-Z][a-z][^\n]*\n\s*+[^\n]*–[^\n]*\n|\Z)',
+    re.MULTILINE
+)
+
+# Anything past this many characters of the experience section is ignored.
+MAX_EXPERIENCE_CHARS = get_settings().parser_max_experience_chars
+
+def parse_experience(raw_text):
+    experience = []
+    # Look for a section header
+    experience_section = SECTION_PATTERN.search(raw_text)
+    if not experience_section:
+        return experience
+
+    start = experience_section.end()
+    text = raw_text[start:start + MAX_EXPERIENCE_CHARS]
+    taxonomy = tagger.get_taxonomy()
+
+    for company_match in ENTRY_PATTERN.finditer(text):
+        company = company_match.group(1).strip()
+        details_block = company_match.group(2).strip()
+
+        for role_match in ROLE_PATTERN.finditer(details_block):
+            title, date_range, description = role_match.groups()
+
+            experience.append({
+                "id": str(uuid.uuid4()),
+                "title": title.strip(),
+                "company": company,
+                "description": description.strip(),
+                **taxonomy.tag(description.lower()),
+            })
+    return experience
@@ -0,0 +1,190 @@
+from collections import Counter
+import math
+from cache import TTLCache
+from ranking import tokenize
+from settings import get_settings
+import tagger
+
+# TF-IDF relevance of a master resume's experience entries to job
+# descriptions. Each entry is one row of a sparse (CSR) matrix built from its
+# title, description, tags and taxonomy labels; a job description is scored
+# against every entry with one sparse matrix-vector product, and a batch of
+# job descriptions with one product against the whole query matrix.
+#
+# numpy is imported where it is used so that it is only loaded once the first
+# version is generated, not at API startup.
+
+# Per-field multipliers on term counts: a word in a title, tag or taxonomy
+# label says more about the role than the same word in its description.
+FIELD_WEIGHTS = {
+    "title": 2.0,
+    "description": 1.0,
+    "tags": 2.0,
+    "functionalRoles": 1.5,
+    "industryDomains": 1.5,
+}
+LABEL_FIELDS = ("functionalRoles", "industryDomains")
+
+# Added to the cosine similarity for each taxonomy label an entry shares with
+# the job description, so that entries tagged with the role or domain being
+# hired for rank ahead of ones that merely share vocabulary.
+LABEL_MATCH_WEIGHT = 0.1
+
+settings = get_settings()
+EXPERIENCE_RANKING_MAX_ENTRIES = settings.experience_ranking_max_entries
+
+# Keyed by (master _id, experienceVersion), which ingestion and tag updates
+# bump whenever the experience list changes.
+experience_index_cache = TTLCache(
+    maxsize=settings.experience_index_cache_max_entries,
+    ttl=settings.experience_index_cache_ttl_seconds,
+)
+
+def _field_text(entry: dict, field: str):
+    value = entry.get(field)
+    if isinstance(value, list):
+        return " ".join(str(item) for item in value if item)
+    return value or ""
+
+def _entry_terms(entry: dict):
+    counts = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(_field_text(entry, field)):
+            counts[term] += weight
+    return counts
+
+def _labels(tags: dict):
+    return {(field, label) for field in LABEL_FIELDS for label in tags.get(field) or []}
+
+class ExperienceIndex:
+    def __init__(self, experience):
+        import numpy as np
+
+        self.entries = [
+            {field: entry.get(field) for field in ("id", "title", "company", "description", "tags", *LABEL_FIELDS)}
+            for entry in experience
+        ]
+
+        rows = [_entry_terms(entry) for entry in self.entries]
+        self.vocabulary = {}
+        document_frequency = []
+        for terms in rows:
+            for term in terms:
+                column = self.vocabulary.setdefault(term, len(self.vocabulary))
+                if column == len(document_frequency):
+                    document_frequency.append(0)
+                document_frequency[column] += 1
+
+        # Smoothed idf, so a term every entry shares still counts a little
+        self.idf = np.log((1 + len(rows)) / (1 + np.array(document_frequency, dtype=np.float64))) + 1
+
+        indptr = [0]
+        indices = []
+        data = []
+        for terms in rows:
+            columns = [self.vocabulary[term] for term in terms]
+            weights = [1 + math.log(count) for count in terms.values()]
+            indices.extend(columns)
+            data.extend(weights)
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.data = np.array(data, dtype=np.float64) * self.idf[self.indices]
+
+        # L2-normalize each row so scores are cosine similarities
+        row_lengths = np.diff(self.indptr)
+        running = np.concatenate([[0.0], np.cumsum(self.data ** 2)])
+        row_norms = np.sqrt(running[self.indptr[1:]] - running[self.indptr[:-1]])
+        self.data /= np.repeat(np.where(row_norms == 0, 1, row_norms), row_lengths)
+
+        self.label_columns = {}
+        for entry in self.entries:
+            for label in sorted(_labels(entry)):
+                self.label_columns.setdefault(label, len(self.label_columns))
+        self.labels = np.zeros((len(self.entries), len(self.label_columns)), dtype=np.float64)
+        for row, entry in enumerate(self.entries):
+            for label in _labels(entry):
+                self.labels[row, self.label_columns[label]] = 1
+
+    def with_tags(self, tags_by_id: dict):
+        # Rebuilt from the entries kept in memory, so a tag update can refresh
+        # the cache without reading the experience back from Mongo.
+        return ExperienceIndex(
+            {**entry, "tags": tags_by_id[entry["id"]]} if entry["id"] in tags_by_id else entry
+            for entry in self.entries
+        )
+
+    def score(self, job_descriptions):
+        # Returns a (job descriptions x entries) array of relevance scores
+        import numpy as np
+
+        queries = np.zeros((len(job_descriptions), len(self.vocabulary)), dtype=np.float64)
+        query_labels = np.zeros((len(job_descriptions), len(self.label_columns)), dtype=np.float64)
+        taxonomy = tagger.get_taxonomy()
+        for row, job_description in enumerate(job_descriptions):
+            for term, count in Counter(tokenize(job_description)).items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    queries[row, column] = (1 + math.log(count)) * self.idf[column]
+            for label in _labels(taxonomy.tag(job_description.lower())):
+                column = self.label_columns.get(label)
+                if column is not None:
+                    query_labels[row, column] = 1
+
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries /= np.where(norms == 0, 1, norms)
+
+        # Sparse product over the stored non-zeros only: the running sum along
+        # each query's row turns every entry's dot product into a difference
+        # between two positions of indptr.
+        products = queries[:, self.indices] * self.data
+        running = np.concatenate([np.zeros((len(job_descriptions), 1)), np.cumsum(products, axis=1)], axis=1)
+        scores = running[:, self.indptr[1:]] - running[:, self.indptr[:-1]]
+        return scores + LABEL_MATCH_WEIGHT * (query_labels @ self.labels.T)
+
+    def rank(self, job_descriptions, limit: int = EXPERIENCE_RANKING_MAX_ENTRIES):
+        # For each job description, the most relevant entries by descending
+        # score; entries that share nothing with it are left out and ties
+        # keep resume order.
+        import numpy as np
+
+        if not job_descriptions:
+            return []
+        if not self.entries:
+            return [[] for _ in job_descriptions]
+
+        rankings = []
+        for scores in self.score(job_descriptions):
+            order = np.argsort(-scores, kind="stable")[:limit]
+            rankings.append([
+                {
+                    "id": self.entries[position]["id"],
+                    "title": self.entries[position]["title"],
+                    "company": self.entries[position]["company"],
+                    "score": round(float(scores[position]), 4),
+                }
+                for position in order
+                if scores[position] > 0
+            ])
+        return rankings
+
+def cache_experience_index(master_id, experience_version, experience):
+    index = experience_index_cache.get((master_id, experience_version))
+    if index is None:
+        index = ExperienceIndex(experience)
+        experience_index_cache.set((master_id, experience_version), index)
+    return index
+
+async def get_experience_index(db, master_resume: dict):
+    key = (master_resume["_id"], master_resume.get("experienceVersion", 0))
+    index = experience_index_cache.get(key)
+    if index is not None:
+        return index
+
+    master_resume = await db.get_collection("resumes").find_one(
+        {"_id": master_resume["_id"]}, {"content.experience": 1, "experienceVersion": 1}
+    )
+    if not master_resume:
+        return ExperienceIndex([])
+    experience = master_resume.get("content", {}).get("experience") or []
+    return cache_experience_index(master_resume["_id"], master_resume.get("experienceVersion", 0), experience)
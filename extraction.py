@@ -0,0 +1,131 @@
+from fastapi import HTTPException
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import multiprocessing
+import os
+import time
+from metrics import PDF_PAGE_SECONDS
+from settings import get_settings
+
+settings = get_settings()
+PDF_MAX_BYTES = settings.pdf_max_bytes
+PDF_MAX_PAGES = settings.pdf_max_pages
+PDF_EXTRACTION_TIMEOUT_SECONDS = settings.pdf_extraction_timeout_seconds
+PDF_EXTRACTION_WORKERS = settings.pdf_extraction_workers
+# Documents longer than this are split into chunks of this many pages and
+# extracted on several workers at once.
+PDF_PAGES_PER_JOB = settings.pdf_pages_per_job
+
+extraction_stats = {"documents": 0, "pages": 0, "seconds": 0.0}
+
+_pool = None
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn keeps the workers free of the parent's Mongo and executor threads
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def _recycle_pool(pool):
+    # Replaces a pool that lost a worker (crash, OOM kill) or has one stuck
+    # on a document. The executor has no public way to stop busy workers, so
+    # they are terminated directly; other jobs still running on the old pool
+    # fail with BrokenProcessPool and are answered with a 503.
+    global _pool
+    if _pool is pool:
+        _pool = None
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _open(source):
+    # Imported here so only the extraction workers load PyMuPDF
+    import fitz
+
+    # Spooled uploads arrive as a path so each worker reads the file itself
+    # instead of receiving a pickled copy of the document.
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+def _extract_pages(source, start, stop, max_pages):
+    started = time.perf_counter()
+    with _open(source) as pdf_document:
+        page_count = len(pdf_document)
+        if page_count > max_pages:
+            return page_count, [], 0.0
+        texts = [
+            pdf_document.load_page(page_num).get_text()
+            for page_num in range(start, min(stop, page_count))
+        ]
+    return page_count, texts, time.perf_counter() - started
+
+async def _extract(source, pool):
+    loop = asyncio.get_running_loop()
+
+    # The first job also reports the page count, so short resumes need a
+    # single round trip to the pool.
+    result = await loop.run_in_executor(
+        pool, _extract_pages, source, 0, PDF_PAGES_PER_JOB, PDF_MAX_PAGES
+    )
+    page_count = result[0]
+    if page_count > PDF_MAX_PAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"PDF has {page_count} pages; the limit is {PDF_MAX_PAGES}.",
+        )
+    _, texts, elapsed = result
+
+    jobs = [
+        loop.run_in_executor(pool, _extract_pages, source, start, start + PDF_PAGES_PER_JOB, PDF_MAX_PAGES)
+        for start in range(PDF_PAGES_PER_JOB, page_count, PDF_PAGES_PER_JOB)
+    ]
+    for _, chunk_texts, chunk_elapsed in await asyncio.gather(*jobs):
+        texts.extend(chunk_texts)
+        elapsed += chunk_elapsed
+
+    extraction_stats["documents"] += 1
+    extraction_stats["pages"] += page_count
+    extraction_stats["seconds"] += elapsed
+    if page_count:
+        PDF_PAGE_SECONDS.observe((), elapsed / page_count)
+    return "".join(texts)
+
+async def extract_pdf_text(source) -> str:
+    # source is the PDF as bytes or the path of a file holding it
+    size = os.path.getsize(source) if isinstance(source, str) else len(source)
+    if size > PDF_MAX_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"PDF exceeds the maximum size of {PDF_MAX_BYTES} bytes.",
+        )
+    pool = _get_pool()
+    try:
+        return await asyncio.wait_for(_extract(source, pool), PDF_EXTRACTION_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        # The timed-out job would keep its worker busy until PyMuPDF returns
+        _recycle_pool(pool)
+        raise HTTPException(status_code=422, detail="PDF took too long to process.")
+    except BrokenProcessPool:
+        _recycle_pool(pool)
+        raise HTTPException(status_code=503, detail="PDF extraction is temporarily unavailable, please try again.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing PDF file: {e}")
+
+def seconds_per_page():
+    if not extraction_stats["pages"]:
+        return 0.0
+    return extraction_stats["seconds"] / extraction_stats["pages"]
@@ -0,0 +1,84 @@
+from pymongo import ASCENDING, IndexModel
+import asyncio
+import logging
+import database
+from settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+def index_models():
+    job_ttl_seconds = get_settings().job_ttl_seconds
+    return {
+        "users": [
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+            IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        ],
+        "resumes": [
+            # _id last so version listings page through the index in order
+            IndexModel([("userId", ASCENDING), ("isMaster", ASCENDING), ("_id", ASCENDING)], name="userId_isMaster_id"),
+        ],
+        "resume_snapshots": [
+            IndexModel([("createdAt", ASCENDING)], name="createdAt"),
+        ],
+        "token_blocklist": [
+            IndexModel([("jti", ASCENDING)], name="jti_unique", unique=True),
+            # Entries are removed once the token they revoke would have expired
+            IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        ],
+        "jobs": [
+            IndexModel([("updatedAt", ASCENDING)], name="updatedAt_ttl", expireAfterSeconds=job_ttl_seconds),
+        ],
+    }
+
+async def ensure_indexes(db):
+    # create_indexes is a no-op for indexes that already exist with the same spec.
+    # Each index is created on its own so one that cannot be built (say, a unique
+    # index over existing duplicates) doesn't keep the others from being created.
+    failures = []
+    for collection_name, indexes in index_models().items():
+        collection = db.get_collection(collection_name)
+        for index in indexes:
+            try:
+                await collection.create_indexes([index])
+            except Exception as e:
+                logger.warning("Could not create index %s on %s: %s", index.document["name"], collection_name, e)
+                failures.append((collection_name, index))
+
+    # Blocklist entries written before expires_at existed would never expire;
+    # give them the longest lifetime a token could have had.
+    token_lifetime_ms = get_settings().access_token_expire_minutes * 60 * 1000
+    await db.get_collection("token_blocklist").update_many(
+        {"expires_at": {"$exists": False}},
+        [{"$set": {"expires_at": {"$add": ["$created_at", token_lifetime_ms]}}}],
+    )
+    return failures
+
+async def duplicate_keys(collection, index, limit=20):
+    fields = list(index.document["key"])
+    pipeline = [
+        {"$group": {"_id": {field.replace(".", "_"): f"${field}" for field in fields}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return [(duplicate["_id"], duplicate["count"]) async for duplicate in await collection.aggregate(pipeline)]
+
+async def main():
+    settings = get_settings()
+    settings.require("mongodb_uri")
+    database.connect(settings.mongodb_uri)
+    try:
+        db = database.get_db()
+        failures = await ensure_indexes(db)
+        for collection_name, index in failures:
+            print(f"Could not create index {index.document['name']} on {collection_name}")
+            if index.document.get("unique"):
+                for key, count in await duplicate_keys(db.get_collection(collection_name), index):
+                    print(f"  {count} documents share {key}")
+    finally:
+        await database.close()
+    if failures:
+        raise SystemExit(1)
+    print("Indexes are up to date")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+from fastapi import HTTPException
+from datetime import datetime
+import asyncio
+import logging
+import uuid
+from settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+INGEST_WORKERS = settings.ingest_workers
+INGEST_QUEUE_SIZE = settings.ingest_queue_size
+
+# Error recorded on jobs still queued or running when the process shuts down
+INTERRUPTED = {"status": 503, "detail": "Processing was interrupted by a server restart, please upload again"}
+
+_queue = None
+_workers = []
+
+def start():
+    global _queue
+    _queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    for _ in range(INGEST_WORKERS):
+        _workers.append(asyncio.create_task(_worker()))
+
+async def stop():
+    # Running jobs are cancelled and marked failed by their worker; queued
+    # ones are failed here and their payloads released, since nothing will
+    # pick them up once this process exits.
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+    while _queue is not None and not _queue.empty():
+        db, job_id, handler, args, cleanup = _queue.get_nowait()
+        if cleanup is not None:
+            cleanup()
+        await _fail_interrupted(db, job_id)
+        _queue.task_done()
+
+async def enqueue(db, user_id, job_type: str, handler, *args, cleanup=None):
+    # Status lives in Mongo so any worker can answer a poll; the payload
+    # itself stays in this process's queue. cleanup is called if the job is
+    # dropped at shutdown without having run.
+    if _queue is None or _queue.full():
+        raise HTTPException(
+            status_code=503,
+            detail="Too many uploads are being processed, please try again shortly",
+            headers={"Retry-After": "5"},
+        )
+    job_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    await db.get_collection("jobs").insert_one({
+        "_id": job_id,
+        "userId": user_id,
+        "type": job_type,
+        "status": "queued",
+        "createdAt": now,
+        "updatedAt": now,
+    })
+    _queue.put_nowait((db, job_id, handler, args, cleanup))
+    return job_id
+
+async def get_job(db, user_id, job_id: str):
+    return await db.get_collection("jobs").find_one({"_id": job_id, "userId": user_id})
+
+async def _set_status(db, job_id, status, **fields):
+    await db.get_collection("jobs").update_one(
+        {"_id": job_id},
+        {"$set": {"status": status, "updatedAt": datetime.utcnow(), **fields}},
+    )
+
+async def _run(db, job_id, handler, args):
+    await _set_status(db, job_id, "running")
+    try:
+        result = await handler(*args)
+    except HTTPException as e:
+        return "failed", {"error": {"status": e.status_code, "detail": e.detail}}
+    except Exception as e:
+        logger.exception("Job %s failed", job_id)
+        return "failed", {"error": {"status": 500, "detail": str(e)}}
+    return "completed", {"result": result}
+
+async def _fail_interrupted(db, job_id):
+    try:
+        await _set_status(db, job_id, "failed", error=INTERRUPTED)
+    except Exception:
+        logger.exception("Could not fail interrupted job %s", job_id)
+
+async def _worker():
+    while True:
+        db, job_id, handler, args, cleanup = await _queue.get()
+        try:
+            status, fields = await _run(db, job_id, handler, args)
+        except asyncio.CancelledError:
+            # Shutting down mid-job; the handler has released its payload
+            await _fail_interrupted(db, job_id)
+            _queue.task_done()
+            raise
+        try:
+            await _set_status(db, job_id, status, **fields)
+        except Exception:
+            logger.exception("Could not record the status of job %s", job_id)
+        finally:
+            _queue.task_done()
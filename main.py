@@ -1,60 +1,65 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from pymongo import MongoClient
-import os
-from dotenv import load_dotenv
+from settings import Settings, get_settings
 from models import UserIn, User
-from auth import get_password_hash, verify_password, create_access_token, get_current_user, oauth2_scheme
+from auth import get_password_hash, verify_and_update_password, run_password_job, password_executor, create_access_token, get_current_user, get_token_payload, blocklist_snapshot, mark_token_blocklisted, invalidate_user, cache_stats
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi import Depends, HTTPException, status
 from datetime import timedelta, datetime
-from jose import jwt, JWTError
+import database
+import extraction
+import jobs
+import tagger
+import metrics
+import profiling
+import versions
+import experience_scoring
+from responses import ORJSONResponse
+from uploads import UploadLimitMiddleware
+from ratelimit import ip_rate_limit
+from fastapi.responses import PlainTextResponse
+from indexes import ensure_indexes
+from pymongo.errors import DuplicateKeyError
+import logging
+from database import get_db
 import resume
 import subscription
 
-# Construct the path to the .env file relative to this script
-dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
-if os.path.exists(dotenv_path):
-    load_dotenv(dotenv_path=dotenv_path)
-else:
-    print(f"Warning: .env file not found at {dotenv_path}")
-
-app = FastAPI()
-
-client = None
+app = FastAPI(default_response_class=ORJSONResponse)
 
 @app.on_event("startup")
 async def startup_db_client():
-    global client
-    mongo_uri = None
-    mongo_uri = os.getenv("MONGODB_URI")
-    if not mongo_uri:
-        try:
-            dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
-            with open(dotenv_path) as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#') and '=' in line:
-                        key, value = line.split('=', 1)
-                        if key.strip() == 'MONGODB_URI':
-                            mongo_uri = value.strip().strip('"\'')
-                            break
-        except FileNotFoundError:
-            pass  # .env file is optional, especially in production
-
-    if not mongo_uri:
-        raise Exception("MONGODB_URI not found in environment variables or .env file")
-        
-    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+    settings = get_settings()
+    settings.require("mongodb_uri", "jwt_secret_key")
+
+    database.connect(settings.mongodb_uri)
+    try:
+        await ensure_indexes(database.get_db())
+    except Exception as e:
+        # Serving without indexes is slow but works; don't refuse to start
+        logging.getLogger(__name__).warning("Could not ensure MongoDB indexes: %s", e)
+    jobs.start()
+    blocklist_snapshot.start(database.get_db())
+    if settings.taxonomy_source == "db":
+        await tagger.load_taxonomy_from_db(database.get_db())
+        tagger.start_db_reload(database.get_db())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    global client
-    client.close()
+    await jobs.stop()
+    await blocklist_snapshot.stop()
+    await tagger.stop_db_reload()
+    await database.close()
+    password_executor.shutdown(wait=False)
+    extraction.shutdown()
+
+# Innermost, so oversized uploads are turned away before the body is parsed
+# while still getting CORS headers on the 413.
+app.add_middleware(UploadLimitMiddleware, paths=["/api/v1/resumes/master"])
 
 # CORS configuration
-origins = os.getenv("CORS_ORIGINS", "http://localhost:5137").split(",")
+origins = list(get_settings().cors_origins)
 
 app.add_middleware(
     CORSMiddleware,
@@ -62,43 +67,72 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor", "X-Request-ID", "X-Experience-Version", "ETag"],
 )
 
-@app.post("/api/v1/auth/register")
-def register_user(user: UserIn):
-    db = client.get_database("resume_pivot")
+if get_settings().profiling_enabled:
+    app.add_middleware(profiling.ProfilingMiddleware)
+# Outermost, so its timings cover the whole stack
+app.add_middleware(metrics.MetricsMiddleware, slow_requests=profiling.slow_requests)
+metrics.install_log_record_factory()
+metrics.register_collector("auth", cache_stats)
+metrics.register_collector("resume", lambda: {
+    "extraction": resume.extraction_cache.stats(),
+    "snapshot": versions.snapshot_cache.stats(),
+    "master_index": resume.master_index_cache.stats(),
+    "experience_index": experience_scoring.experience_index_cache.stats(),
+})
+
+@app.post("/api/v1/auth/register", dependencies=[Depends(ip_rate_limit("register"))])
+async def register_user(user: UserIn, db = Depends(get_db)):
     users_collection = db.get_collection("users")
     
-    if users_collection.find_one({"email": user.email}):
+    if await users_collection.find_one({"email": user.email}):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
         )
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await run_password_job(get_password_hash, user.password)
     user_data = user.dict()
     user_data["hashed_password"] = hashed_password
+    user_data["versionCount"] = 0
     del user_data["password"]
     
-    users_collection.insert_one(user_data)
+    try:
+        await users_collection.insert_one(user_data)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username or email already registered",
+        )
     
     return {"message": "User registered successfully", "user": {"username": user.username, "email": user.email}}
 
-@app.post("/api/v1/auth/login")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    db = client.get_database("resume_pivot")
+@app.post("/api/v1/auth/login", dependencies=[Depends(ip_rate_limit("login"))])
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db = Depends(get_db),
+    settings: Settings = Depends(get_settings)
+):
     users_collection = db.get_collection("users")
     
-    user = users_collection.find_one({"username": form_data.username})
+    user = await users_collection.find_one({"username": form_data.username})
     
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    if user:
+        valid, new_hash = await run_password_job(verify_and_update_password, form_data.password, user["hashed_password"])
+    if not user or not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    if new_hash:
+        await users_collection.update_one({"_id": user["_id"]}, {"$set": {"hashed_password": new_hash}})
+        invalidate_user(user["email"])
     
-    access_token_expires = timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60)))
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
         data={"sub": user["email"]}, expires_delta=access_token_expires
     )
@@ -106,46 +140,45 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     return {"access_token": access_token, "token_type": "bearer", "user": {"username": user["username"], "email": user["email"], "subscriptionTier": user.get("subscription", "free")}}
 
 @app.post("/api/v1/auth/logout")
-def logout(token: str = Depends(oauth2_scheme), _: User = Depends(get_current_user)):
-    try:
-        payload = jwt.decode(token, os.getenv("JWT_SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")])
-        jti = payload.get("jti")
-        
-        db = client.get_database("resume_pivot")
-        blocklist_collection = db.get_collection("token_blocklist")
-        
-        blocklist_collection.insert_one({
-            "jti": jti,
-            "created_at": datetime.utcnow()
-        })
-        
-        return {"message": "Successfully logged out"}
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+async def logout(payload: dict = Depends(get_token_payload), _: User = Depends(get_current_user), db = Depends(get_db)):
+    jti = payload.get("jti")
+    
+    blocklist_collection = db.get_collection("token_blocklist")
+    
+    await blocklist_collection.insert_one({
+        "jti": jti,
+        "created_at": datetime.utcnow(),
+        "expires_at": datetime.utcfromtimestamp(payload["exp"])
+    })
+    mark_token_blocklisted(jti)
+    
+    return {"message": "Successfully logged out"}
 
 app.include_router(resume.router, prefix="/api/v1", tags=["resume"])
 app.include_router(subscription.router, prefix="/api/v1", tags=["subscription"])
+app.include_router(profiling.router, prefix="/api/v1", tags=["admin"])
 
 @app.get("/api/v1/users/me", response_model=User)
 async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
+@app.get("/api/v1/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
 
 @app.get("/api/v1/healthz")
-def health_check():
+async def health_check():
     try:
         # Ping the database to check the connection
-        client.admin.command('ping')
+        await database.client.admin.command('ping')
         return {"status": "ok"}
     except Exception as e:
         return {"status": "error", "details": str(e)}
 
 if __name__ == "__main__":
+    # Single-process development server; see serve.py for production
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
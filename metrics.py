@@ -0,0 +1,211 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pymongo import monitoring
+import heapq
+import itertools
+import logging
+import random
+import time
+import uuid
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, name: str, description: str, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            # per-bucket counts, sum, count
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = "{" + label_text + "}" if label_text else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")
+)
+STAGE_SECONDS = Histogram(
+    "request_stage_duration_seconds", "Time spent in named stages of request handling.", ("route", "stage")
+)
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency.", ("command", "outcome")
+)
+PDF_PAGE_SECONDS = Histogram(
+    "pdf_extraction_seconds_per_page", "PyMuPDF extraction time per page.", (),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5),
+)
+HISTOGRAMS = [REQUEST_SECONDS, STAGE_SECONDS, MONGO_COMMAND_SECONDS, PDF_PAGE_SECONDS]
+
+# group -> callable returning {cache_name: {stat: number}}; rendered as gauges
+_collectors = {}
+
+def register_collector(name: str, collect):
+    _collectors[name] = collect
+
+# Per-request state: the ASGI scope (the matched route is filled in by the
+# router) and the stage timings recorded so far.
+_current_request = ContextVar("current_request", default=None)
+
+def current_request_id():
+    request = _current_request.get()
+    return request["request_id"] if request else None
+
+def current_stages():
+    request = _current_request.get()
+    return dict(request["stages"]) if request else {}
+
+def route_of(scope):
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+@contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        request = _current_request.get()
+        route = route_of(request["scope"]) if request else "background"
+        STAGE_SECONDS.observe((route, stage), elapsed)
+        if request:
+            request["stages"][stage] = request["stages"].get(stage, 0.0) + elapsed
+
+# The slowest requests per route among a random sample of all requests,
+# each with its stage timings. Holds at most per_route entries per route.
+class SlowRequestLog:
+    def __init__(self, per_route: int, sample_rate: float):
+        self.per_route = per_route
+        self.sample_rate = sample_rate
+        self._routes = {}
+        self._order = itertools.count()
+
+    def offer(self, scope, status_code: int, duration: float, request_id: str, stages: dict):
+        if random.random() >= self.sample_rate:
+            return
+        route = route_of(scope)
+        heap = self._routes.setdefault(route, [])
+        if len(heap) >= self.per_route and duration <= heap[0][0]:
+            return
+        entry = {
+            "requestId": request_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "durationSeconds": duration,
+            # Copied: background tasks started by the request may still add to it
+            "stages": dict(stages),
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        # Min-heap on duration, so the fastest kept request is replaced first
+        item = (duration, next(self._order), entry)
+        if len(heap) < self.per_route:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heapreplace(heap, item)
+
+    def snapshot(self):
+        return {
+            route: [entry for _, _, entry in sorted(heap, reverse=True)]
+            for route, heap in sorted(self._routes.items())
+        }
+
+class MetricsMiddleware:
+    def __init__(self, app, slow_requests: SlowRequestLog = None):
+        self.app = app
+        self.slow_requests = slow_requests
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+
+        request = {"scope": scope, "request_id": request_id, "stages": {}}
+        token = _current_request.set(request)
+        status_code = 500
+        header = (b"x-request-id", request_id.encode("latin-1"))
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [header]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUEST_SECONDS.observe((scope["method"], route_of(scope), str(status_code)), elapsed)
+            if self.slow_requests is not None:
+                self.slow_requests.offer(scope, status_code, elapsed, request_id, request["stages"])
+            _current_request.reset(token)
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe((event.command_name, "success"), event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.observe((event.command_name, "failure"), event.duration_micros / 1e6)
+
+def render():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    if _collectors:
+        lines.append("# HELP cache_stat In-process cache size and hit/miss/eviction counts.")
+        lines.append("# TYPE cache_stat gauge")
+    for group, collect in _collectors.items():
+        for cache_name, stats in collect().items():
+            for stat, value in stats.items():
+                lines.append(f'cache_stat{{group="{group}",cache="{_escape(cache_name)}",stat="{stat}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def install_log_record_factory():
+    # Adds record.request_id so log formats can include %(request_id)s
+    factory = logging.getLogRecordFactory()
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.request_id = current_request_id() or "-"
+        return record
+
+    logging.setLogRecordFactory(record_factory)
@@ -0,0 +1,133 @@
+from bson import encode
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import database
+from settings import get_settings
+from textstore import pack_text
+from versions import encode_content, ensure_master_snapshot, get_snapshot
+
+# Rewrites full-copy resume versions as deltas against their owner's master
+# snapshot, and optionally removes snapshots nothing points at any more.
+# Replacing a master already deletes its previous snapshot once no version
+# uses it; --prune-snapshots catches the ones a crash or a concurrent update
+# left behind.
+
+async def migrate_versions(db, dry_run: bool):
+    resumes_collection = db.get_collection("resumes")
+    migrated = skipped = bytes_before = bytes_after = 0
+    snapshots = {}
+
+    async for version in resumes_collection.find(
+        {"isMaster": False, "content.raw": {"$exists": True}},
+        {"userId": 1, "content": 1},
+    ):
+        user_id = version["userId"]
+        if user_id not in snapshots:
+            master_resume = await resumes_collection.find_one(
+                {"userId": user_id, "isMaster": True},
+                {"userId": 1, "snapshotId": 1, "content.raw": 1},
+            )
+            snapshots[user_id] = await ensure_master_snapshot(db, master_resume) if master_resume else None
+
+        snapshot_id = snapshots[user_id]
+        if snapshot_id is None:
+            skipped += 1
+            continue
+
+        raw_text, master_lines = await get_snapshot(db, snapshot_id)
+        content = encode_content(snapshot_id, raw_text, master_lines, version["content"]["raw"])
+        before = len(encode({"content": version["content"]}))
+        after = len(encode({"content": content}))
+        if "delta" not in content or after >= before:
+            skipped += 1
+            continue
+
+        if not dry_run:
+            await resumes_collection.update_one({"_id": version["_id"]}, {"$set": {"content": content}})
+        migrated += 1
+        bytes_before += before
+        bytes_after += after
+
+    print(f"Migrated {migrated} versions, skipped {skipped}")
+    print(f"Content size {bytes_before} -> {bytes_after} bytes")
+
+async def prune_snapshots(db, dry_run: bool):
+    resumes_collection = db.get_collection("resumes")
+    referenced = set()
+    async for resume in resumes_collection.find({}, {"snapshotId": 1, "content.delta.snapshotId": 1}):
+        if resume.get("snapshotId"):
+            referenced.add(resume["snapshotId"])
+        delta = resume.get("content", {}).get("delta")
+        if delta:
+            referenced.add(delta["snapshotId"])
+
+    # Leave recent snapshots alone: a request may have created one that it
+    # has not yet referenced.
+    cutoff = datetime.utcnow() - timedelta(hours=1)
+    snapshots_collection = db.get_collection("resume_snapshots")
+    unreferenced = [
+        snapshot["_id"]
+        async for snapshot in snapshots_collection.find({"createdAt": {"$lt": cutoff}}, {"_id": 1})
+        if snapshot["_id"] not in referenced
+    ]
+    if unreferenced and not dry_run:
+        await snapshots_collection.delete_many({"_id": {"$in": unreferenced}})
+    print(f"Removed {len(unreferenced)} unreferenced snapshots")
+
+async def compress_raw_text(db, dry_run: bool):
+    # Masters and snapshots written before compressed storage keep their
+    # text as a plain string; rewrite the ones above the threshold.
+    compressed = bytes_saved = 0
+    targets = [
+        ("resumes", {"isMaster": True, "content.raw": {"$type": "string"}}, "content.raw"),
+        ("resume_snapshots", {"raw": {"$type": "string"}}, "raw"),
+    ]
+    for collection_name, query, field in targets:
+        collection = db.get_collection(collection_name)
+        async for document in collection.find(query, {field: 1}):
+            raw_text = document["content"]["raw"] if field == "content.raw" else document["raw"]
+            packed = pack_text(raw_text)
+            if isinstance(packed, str):
+                continue
+            if not dry_run:
+                await collection.update_one({"_id": document["_id"]}, {"$set": {field: packed}})
+            compressed += 1
+            bytes_saved += len(raw_text.encode("utf-8")) - len(packed)
+    print(f"Compressed {compressed} documents, saving {bytes_saved} bytes")
+
+async def convert_string_content(db, dry_run: bool):
+    # The original PUT /resumes/master stored content as a plain string;
+    # everything since expects a document with a raw field.
+    resumes_collection = db.get_collection("resumes")
+    converted = 0
+    async for master_resume in resumes_collection.find({"isMaster": True, "content": {"$type": "string"}}, {"content": 1}):
+        if not dry_run:
+            await resumes_collection.update_one(
+                {"_id": master_resume["_id"], "content": master_resume["content"]},
+                {"$set": {"content": {"raw": pack_text(master_resume["content"])}}},
+            )
+        converted += 1
+    print(f"Converted {converted} masters with plain-string content")
+
+async def main(args):
+    settings = get_settings()
+    settings.require("mongodb_uri")
+    database.connect(settings.mongodb_uri)
+    try:
+        db = database.get_db()
+        await convert_string_content(db, args.dry_run)
+        await migrate_versions(db, args.dry_run)
+        if args.prune_snapshots:
+            await prune_snapshots(db, args.dry_run)
+        if args.compress_raw:
+            await compress_raw_text(db, args.dry_run)
+    finally:
+        await database.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert full-copy resume versions to delta storage")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--prune-snapshots", action="store_true", help="delete snapshots no resume references")
+    parser.add_argument("--compress-raw", action="store_true", help="compress large master and snapshot text")
+    asyncio.run(main(parser.parse_args()))
@@ -1,5 +1,5 @@
 from datetime import datetime
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 
 class User(BaseModel):
@@ -20,15 +20,17 @@ class ResumeVersionRequest(BaseModel):
     jobDescription: str
     versionName: str
 
+class ResumeVersionBatchRequest(BaseModel):
+    versions: List[ResumeVersionRequest] = Field(..., min_length=1, max_length=50)
+
 class SubscriptionUpgradeRequest(BaseModel):
     tierId: str
 
-class Experience(BaseModel):
+class ExperienceTagUpdate(BaseModel):
     id: str
-    title: str
-    company: str
-    description: str
     tags: Optional[List[str]] = []
 
 class TagUpdateRequest(BaseModel):
-    experience: List[Experience]
+    # Only the entries being changed need to be sent
+    experience: List[ExperienceTagUpdate] = Field(..., min_length=1)
+    expectedVersion: Optional[int] = None
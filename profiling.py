@@ -0,0 +1,182 @@
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import hmac
+import os
+import sys
+import threading
+import time
+import metrics
+from responses import ORJSONResponse
+from settings import get_settings
+
+# Opt-in diagnostics for live traffic, all off unless configured:
+#
+# - PROFILING_ENABLED: a request sent with "X-Profile: <ADMIN_TOKEN>" runs
+#   under a sampling profiler. The profile is kept in memory (the last
+#   PROFILING_MAX_PROFILES) under the request's id, returned in X-Profile-Id,
+#   and served as collapsed stacks for flamegraph.pl or speedscope.
+# - SLOW_REQUEST_SAMPLE_RATE: metrics.SlowRequestLog keeps the slowest
+#   sampled requests per route with their stage timings.
+#
+# When disabled the middleware is not installed and MetricsMiddleware skips
+# the slow-request log, so ordinary requests pay nothing.
+
+settings = get_settings()
+
+# A thread whose innermost frame is in one of these files is blocked waiting
+# for work; such stacks are dropped, except on the event loop's thread where
+# waiting on I/O is part of the request's time.
+IDLE_FILES = {"threading.py", "queue.py", "selectors.py", "thread.py"}
+
+def _frame_label(frame):
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _collapse(frame, thread_name: str):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name.replace(";", ":"))
+    return ";".join(reversed(labels))
+
+# Samples every thread's Python stack from a background thread and counts
+# identical stacks. Everything the worker process runs meanwhile is sampled,
+# including other requests on the event loop; PDF extraction runs in the
+# extraction process pool and shows up only as the time spent waiting for it.
+class StackSampler:
+    def __init__(self, interval: float, max_seconds: float, loop_thread_id: int):
+        self.interval = interval
+        self.max_samples = max(1, int(max_seconds / interval))
+        self.loop_thread_id = loop_thread_id
+        self.samples = 0
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while self.samples < self.max_samples and not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id != self.loop_thread_id and os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                self.stacks[_collapse(frame, names.get(thread_id, f"thread-{thread_id}"))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+# request id -> profile, oldest first
+profiles = OrderedDict()
+
+def store_profile(profile: dict):
+    profiles[profile["requestId"]] = profile
+    while len(profiles) > settings.profiling_max_profiles:
+        profiles.popitem(last=False)
+
+class ProfilingMiddleware:
+    def __init__(self, app, token: str = settings.admin_token):
+        self.app = app
+        self._token = token.encode("latin-1")
+        # One profile at a time: concurrent profiles would sample each other
+        self._busy = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                requested = value
+                break
+        if requested is None or not hmac.compare_digest(requested, self._token):
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = metrics.current_request_id()
+        sampler = StackSampler(settings.profiling_interval_seconds, settings.profiling_max_seconds, threading.get_ident())
+        status_code = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            self._busy.release()
+            store_profile({
+                "requestId": request_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": metrics.route_of(scope),
+                "status": status_code,
+                "durationSeconds": time.perf_counter() - started,
+                "stages": metrics.current_stages(),
+                "samples": sampler.samples,
+                "intervalSeconds": sampler.interval,
+                "truncated": sampler.samples >= sampler.max_samples,
+                "at": datetime.now(timezone.utc).isoformat(),
+                "collapsed": sampler.collapsed(),
+            })
+
+slow_requests = (
+    metrics.SlowRequestLog(settings.slow_request_per_route, settings.slow_request_sample_rate)
+    if settings.slow_request_sample_rate > 0 else None
+)
+
+router = APIRouter()
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+# The handlers are async so they read the stores on the event loop, which is
+# the only place they are written.
+
+@router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    return ORJSONResponse([
+        {key: value for key, value in profile.items() if key != "collapsed"}
+        for profile in reversed(profiles.values())
+    ])
+
+@router.get("/admin/profiles/{request_id}", dependencies=[Depends(require_admin)])
+async def get_profile(request_id: str, format: str = Query("collapsed", pattern="^(collapsed|json)$")):
+    profile = profiles.get(request_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "json":
+        return ORJSONResponse(profile)
+    return PlainTextResponse(profile["collapsed"])
+
+@router.get("/admin/slow-requests", dependencies=[Depends(require_admin)])
+async def get_slow_requests():
+    return ORJSONResponse(slow_requests.snapshot() if slow_requests is not None else {})
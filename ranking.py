@@ -0,0 +1,101 @@
+from collections import Counter
+from functools import lru_cache
+import math
+import re
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+[+#]*")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been
+before being below between both but by can could did do does doing down during each
+etc few for from further had has have having he her here hers him his how i if in
+into is it its itself just me more most my no nor not now of off on once only or
+other our ours out over own per same she should so some such than that the their
+theirs them then there these they this those through to too under until up very via
+was we were what when where which while who whom why will with within without would
+you your yours
+""".split())
+
+# Ordered longest first; a suffix is only removed when at least three
+# characters of stem remain.
+_SUFFIXES = (
+    "ational", "ization", "fulness", "iveness", "ements", "ments", "ement", "ment",
+    "ation", "ings", "ing", "ness", "ities", "ity", "ies", "ied", "ed", "ers", "er",
+    "ly", "es", "s",
+)
+
+def _strip_suffix(token: str):
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            if suffix == "s" and token[-2] in "su":
+                return token
+            token = token[: -len(suffix)]
+            if suffix in ("ies", "ied", "ities"):
+                token += "y"
+            return token
+    return token
+
+# Resumes and job descriptions reuse a small vocabulary, so stems are memoized
+@lru_cache(maxsize=65536)
+def stem(token: str):
+    if token.isdigit() or len(token) <= 3:
+        return token
+    # Two rounds so that "engineering" and "engineers" meet at the same stem.
+    token = _strip_suffix(_strip_suffix(token))
+    if len(token) > 4 and token.endswith("e"):
+        token = token[:-1]
+    # "mapping" -> "mapp" -> "map"
+    if len(token) > 3 and token[-1] == token[-2] and token[-1] not in "lsz":
+        token = token[:-1]
+    return token
+
+def tokenize(text: str):
+    return [
+        stem(token)
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+def build_index(raw_text: str):
+    # Each line of the resume is a document. Stored next to content.raw so
+    # version generation only touches the postings of the query terms.
+    postings = {}
+    lengths = []
+    for line_no, line in enumerate(raw_text.splitlines()):
+        terms = Counter(tokenize(line))
+        lengths.append(sum(terms.values()))
+        for term, tf in terms.items():
+            postings.setdefault(term, []).append([line_no, tf])
+    non_empty = [length for length in lengths if length]
+    return {
+        "postings": postings,
+        "lengths": lengths,
+        "docCount": len(non_empty),
+        "avgLength": sum(non_empty) / len(non_empty) if non_empty else 0.0,
+    }
+
+def score_lines(index: dict, query: str):
+    postings = index["postings"]
+    lengths = index["lengths"]
+    doc_count = index["docCount"]
+    avg_length = index["avgLength"] or 1.0
+
+    scores = {}
+    for term in set(tokenize(query)):
+        term_postings = postings.get(term)
+        if not term_postings:
+            continue
+        df = len(term_postings)
+        idf = math.log((doc_count - df + 0.5) / (df + 0.5) + 1)
+        for line_no, tf in term_postings:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[line_no] / avg_length)
+            scores[line_no] = scores.get(line_no, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return scores
+
+def rank_lines(index: dict, query: str):
+    # Line numbers by descending relevance; ties keep resume order.
+    scores = score_lines(index, query)
+    return sorted(scores, key=lambda line_no: (-scores[line_no], line_no))
@@ -0,0 +1,152 @@
+from collections import OrderedDict
+from fastapi import Depends, HTTPException, Request, status
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from auth import get_current_user
+from settings import get_settings
+
+# Token buckets: each key holds up to `capacity` tokens and regains
+# capacity / 60 per second. A request spends `cost` tokens or is refused
+# with the time until enough have been regained.
+#
+# The default store is per worker. RATE_LIMIT_STORE=sqlite keeps the buckets
+# in a SQLite file so every worker on the host shares them.
+
+settings = get_settings()
+
+def _spend(tokens, updated_at, now, capacity, refill_per_second, cost):
+    tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / refill_per_second
+
+class MemoryBucketStore:
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, capacity: float, refill_per_second: float, cost: float):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens, retry_after = _spend(tokens, updated_at, now, capacity, refill_per_second, cost)
+            self._buckets[key] = (tokens, now)
+            # Least recently used keys go first; a dropped bucket is simply full
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+class SqliteBucketStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated_at REAL)"
+            )
+            self._connection = connection
+        return self._connection
+
+    def _take(self, key, capacity, refill_per_second, cost):
+        # Wall-clock time, since the buckets are shared between processes
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated_at = row if row else (capacity, now)
+                tokens, retry_after = _spend(tokens, updated_at, now, capacity, refill_per_second, cost)
+                connection.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)", (key, tokens, now)
+                )
+                self._writes += 1
+                if self._writes % 1000 == 0:
+                    # Buckets idle for an hour have refilled; drop them
+                    connection.execute("DELETE FROM buckets WHERE updated_at < ?", (now - 3600,))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return retry_after
+
+    async def take(self, key: str, capacity: float, refill_per_second: float, cost: float):
+        return await asyncio.to_thread(self._take, key, capacity, refill_per_second, cost)
+
+store = (
+    SqliteBucketStore(settings.rate_limit_sqlite_path)
+    if settings.rate_limit_store == "sqlite" else MemoryBucketStore()
+)
+
+# Requests allowed per minute on the free tier, per user or client IP
+RATE_LIMITS = {
+    "upload": settings.rate_limit_upload_per_minute,
+    "generate": settings.rate_limit_generate_per_minute,
+    "login": settings.rate_limit_login_per_minute,
+    "register": settings.rate_limit_register_per_minute,
+}
+
+async def check_rate_limit(name: str, key: str, tier: str = "free", cost: int = 1):
+    if not settings.rate_limit_enabled:
+        return
+    per_minute = RATE_LIMITS[name]
+    if tier != "free":
+        per_minute *= settings.rate_limit_paid_multiplier
+    # A request costing more than the whole bucket waits for a full bucket
+    cost = min(cost, per_minute)
+    retry_after = await store.take(f"{name}:{key}", per_minute, per_minute / 60, cost)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+async def check_user_rate_limit(name: str, current_user: dict, cost: int = 1):
+    await check_rate_limit(name, str(current_user["_id"]), current_user.get("subscription", "free"), cost)
+
+def user_rate_limit(name: str):
+    # get_current_user is resolved once per request, so this shares the
+    # handler's lookup.
+    async def dependency(current_user: dict = Depends(get_current_user)):
+        await check_user_rate_limit(name, current_user)
+    return dependency
+
+def ip_rate_limit(name: str):
+    async def dependency(request: Request):
+        await check_rate_limit(name, request.client.host if request.client else "unknown")
+    return dependency
+
+# Per-worker cap on requests running an expensive route at once. Requests
+# wait up to CONCURRENCY_WAIT_SECONDS for a slot before being shed.
+class ConcurrencyLimit:
+    def __init__(self, limit: int):
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def __call__(self):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), settings.concurrency_wait_seconds)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+upload_concurrency = ConcurrencyLimit(settings.upload_concurrency)
+generate_concurrency = ConcurrencyLimit(settings.generate_concurrency)
@@ -0,0 +1,26 @@
+import argparse
+import asyncio
+import database
+from settings import get_settings
+from subscription import reconcile_version_counts
+
+# Repairs users' versionCount (the per-user quota counter) from the resume
+# versions actually stored. Safe to run while the API is serving.
+
+async def main(args):
+    settings = get_settings()
+    settings.require("mongodb_uri")
+    database.connect(settings.mongodb_uri)
+    try:
+        counts = await reconcile_version_counts(database.get_db(), args.dry_run)
+    finally:
+        await database.close()
+    if args.dry_run:
+        print(f"{counts['drifted']} of {counts['checked']} version counters would be repaired")
+    else:
+        print(f"Repaired {counts['repaired']} of {counts['checked']} version counters")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repair per-user resume version counters")
+    parser.add_argument("--dry-run", action="store_true", help="report drifted counters without writing")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,15 @@
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+import orjson
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class ORJSONResponse(JSONResponse):
+    # orjson handles datetime natively; ObjectId is written as its hex string.
+    # Handlers that return large bodies build this directly, which also skips
+    # FastAPI's jsonable_encoder pass over the content.
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
@@ -1,356 +1,725 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from pymongo import MongoClient
-import os
-import fitz  # PyMuPDF
-from auth import get_current_user
-from models import User, ResumeVersionRequest, TagUpdateRequest
-import re
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Query, Response
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Optional
 import uuid
+from auth import get_current_user
+from database import get_db
+from cache import TTLCache
+from metrics import span
+from ratelimit import check_user_rate_limit, generate_concurrency, upload_concurrency, user_rate_limit
+from settings import get_settings
+from responses import ORJSONResponse
+from extraction import extract_pdf_text
+from uploads import SpooledUpload, spool_upload
+import jobs
+import tagger
+from experience_parser import parse_experience
+from experience_scoring import cache_experience_index, experience_index_cache, get_experience_index
+from ranking import build_index, rank_lines
+from versions import (
+    apply_delta, create_snapshot, encode_content, encode_line_numbers,
+    discard_snapshot, ensure_master_snapshot, get_snapshot, load_master_snapshot_id, make_delta,
+    materialize_content, release_snapshot, retain_snapshot,
+)
+from textstore import pack_text, unpack_text
+from subscription import quota_exceeded_detail, release_versions, reserve_versions
+from models import User, ResumeVersionRequest, ResumeVersionBatchRequest, TagUpdateRequest
 
 router = APIRouter()
 
-def get_db():
-    client = MongoClient(os.getenv("MONGODB_URI"))
-    db = client.get_database("resume_pivot")
-    return db
+# Extraction results shared across users, keyed by content type, hash and
+# the taxonomy version the experience was tagged with.
+extraction_cache = TTLCache(
+    maxsize=get_settings().extraction_cache_max_entries,
+    ttl=get_settings().extraction_cache_ttl_seconds,
+)
+
+# BM25 postings run to several times the size of the text they index. Past
+# INDEX_PERSIST_MAX_BYTES of text they could push the master document over
+# MongoDB's 16 MB limit, so they are not stored; generation builds them from
+# the snapshot and keeps them here, keyed by snapshot id.
+INDEX_PERSIST_MAX_BYTES = get_settings().index_persist_max_bytes
+master_index_cache = TTLCache(
+    maxsize=get_settings().master_index_cache_max_entries,
+    ttl=get_settings().master_index_cache_ttl_seconds,
+)
+
+def index_is_persisted(raw_text: str):
+    return len(raw_text.encode("utf-8")) <= INDEX_PERSIST_MAX_BYTES
+
+async def extract_master_content(upload: SpooledUpload):
+    cache_key = (upload.content_type, upload.content_hash, tagger.taxonomy_version())
+    cached = extraction_cache.get(cache_key)
+    if cached is not None:
+        raw_text, experience, index = cached
+        # Experience ids must stay unique per resume
+        experience = [{**entry, "id": str(uuid.uuid4())} for entry in experience]
+        return raw_text, experience, index, True
+
+    if upload.is_pdf:
+        with span("pdf_extraction"):
+            raw_text = await extract_pdf_text(upload.pdf_source)
+    else:
+        raw_text = upload.text
 
-def parse_experience(raw_text):
-    experience = []
-    # Look for a section header
-    experience_section = re.search(r"(?i)(experience|work history|employment)", raw_text)
-    if not experience_section:
-        return experience
+    with span("parse_experience"):
+        experience = parse_experience(raw_text)
+    with span("index_build"):
+        index = build_index(raw_text) if index_is_persisted(raw_text) else None
+    extraction_cache.set(cache_key, (raw_text, experience, index))
+    return raw_text, experience, index, False
 
-    text = raw_text[experience_section.end():]
-    
-    FUNCTIONAL_ROLES = {
-        "Software Engineering": ["python", "backend", "api", "developer", "software"],
-        "Product Management": ["product", "roadmap", "feature", "agile"]
-    }
+async def ingest_master_resume(db, user_id, upload: SpooledUpload):
+    try:
+        return await _ingest_master_resume(db, user_id, upload)
+    finally:
+        upload.cleanup()
 
-    INDUSTRY_DOMAINS = {
-        "E-commerce": ["e-commerce", "inventory", "payment"],
-        "Fintech": ["fintech", "payment", "financial"]
-    }
+async def _ingest_master_resume(db, user_id, upload: SpooledUpload):
+    resumes_collection = db.get_collection("resumes")
 
-    # Simple regex to find job title, company, and date range
-    # This is a heuristic and may need to be improved
-    # This regex is designed to find blocks of text that represent a single company's experience.
-    entry_pattern = re.compile(
-        r'^\s*([A-Z\s]{2,})\s*\n([\s\S]+?)(?=\n\s*[A-Z\s]{2,}\n|\n\s*(?:Projects|Awards|Additional)\s*\n|\Z)',
-        re.MULTILINE
-    )
+    content_hash = upload.content_hash
+    content_type = upload.content_type
 
-    for company_match in entry_pattern.finditer(text):
-        company = company_match.group(1).strip()
-        details_block = company_match.group(2).strip()
+    # Re-uploading the file the master was built from changes nothing
+    existing = await resumes_collection.find_one(
+        {"userId": user_id, "isMaster": True, "contentHash": content_hash, "contentType": content_type},
+        {"content.raw": 1, "content.experience": 1}
+    )
+    if existing:
+        content = existing.get("content", {})
+        return {
+            "content": {"raw": unpack_text(content.get("raw")), "experience": content.get("experience", [])},
+            "cacheHit": True,
+        }
 
-        # This regex finds individual job roles within the company's block of text.
-        role_pattern = re.compile(
-            r'^\s*(.*?)\n\s*(.*?–.*?)\n([\s\S]+?)(?=\n\s*[A-Z][a-z].*?\n\s*.*?\–.*?\n|\Z)',
-            re.MULTILINE
-        )
+    raw_text, experience, index, cache_hit = await extract_master_content(upload)
+    content = {"raw": pack_text(raw_text), "experience": experience}
+    if index is not None:
+        content["index"] = index
+    snapshot_id = await create_snapshot(db, user_id, raw_text)
 
-        for role_match in role_pattern.finditer(details_block):
-            title, date_range, description = role_match.groups()
-            
-            functional_roles = []
-            industry_domains = []
-
-            # Auto-tagging logic
-            for role, keywords in FUNCTIONAL_ROLES.items():
-                if any(keyword in description.lower() for keyword in keywords):
-                    if role not in functional_roles:
-                        functional_roles.append(role)
-
-            for domain, keywords in INDUSTRY_DOMAINS.items():
-                if any(keyword in description.lower() for keyword in keywords):
-                    if domain not in industry_domains:
-                        industry_domains.append(domain)
-
-            experience.append({
-                "id": str(uuid.uuid4()),
-                "title": title.strip(),
-                "company": company,
-                "description": description.strip(),
-                "functionalRoles": functional_roles,
-                "industryDomains": industry_domains
-            })
-    return experience
+    resume_data = {
+        "userId": user_id,
+        "isMaster": True,
+        "name": "Master Resume",
+        "snapshotId": snapshot_id,
+        "contentHash": content_hash,
+        "contentType": content_type,
+        "content": content,
+        "updatedAt": datetime.utcnow(),
+    }
 
-@router.post("/resumes/master")
+    with span("mongo_write"):
+        try:
+            previous = await resumes_collection.find_one_and_update(
+                {"userId": user_id, "isMaster": True},
+                {"$set": resume_data, "$inc": {"experienceVersion": 1, "revision": 1}},
+                projection={"experienceVersion": 1, "snapshotId": 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except Exception:
+            await discard_snapshot(db, snapshot_id)
+            raise
+        if previous:
+            master_id, experience_version = previous["_id"], previous.get("experienceVersion", 0) + 1
+            await release_snapshot(db, user_id, previous.get("snapshotId"))
+        else:
+            created = await resumes_collection.find_one({"userId": user_id, "isMaster": True}, {"experienceVersion": 1})
+            if not created:
+                raise HTTPException(status_code=500, detail="Failed to upload master resume")
+            master_id, experience_version = created["_id"], created["experienceVersion"]
+
+    # Build the scoring matrix now rather than on the first generation
+    with span("experience_index"):
+        cache_experience_index(master_id, experience_version, experience)
+    return {"content": {"raw": raw_text, "experience": experience}, "cacheHit": cache_hit}
+
+@router.post(
+    "/resumes/master",
+    dependencies=[Depends(user_rate_limit("upload")), Depends(upload_concurrency)],
+)
 async def upload_master_resume(
     current_user: User = Depends(get_current_user),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    async_mode: bool = Query(False, alias="async"),
+    db = Depends(get_db)
 ):
-    db = get_db()
-    resumes_collection = db.get_collection("resumes")
-
-    file_bytes = await file.read()
+    with span("upload_spool"):
+        upload = await spool_upload(file)
 
-    if file.content_type == "application/pdf":
-        try:
-            pdf_document = fitz.open(stream=file_bytes, filetype="pdf")
-            raw_text = ""
-            for page_num in range(len(pdf_document)):
-                page = pdf_document.load_page(page_num)
-                raw_text += page.get_text()
-            pdf_document.close()
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error processing PDF file: {e}")
-    else:
+    if async_mode:
+        # The job owns the spooled file from here and removes it when done
         try:
-            raw_text = file_bytes.decode("utf-8")
-        except UnicodeDecodeError:
-            raise HTTPException(status_code=400, detail="File is not a valid PDF or plain text file.")
-
-    experience = parse_experience(raw_text)
-
-    resume_data = {
-        "userId": current_user["_id"],
-        "isMaster": True,
-        "name": "Master Resume",
-        "content": {
-            "raw": raw_text,
-            "experience": experience
-        },
+            job_id = await jobs.enqueue(
+                db, current_user["_id"], "master_resume_ingest",
+                ingest_master_resume, db, current_user["_id"], upload,
+                cleanup=upload.cleanup,
+            )
+        except BaseException:
+            upload.cleanup()
+            raise
+        return JSONResponse(status_code=202, content={"jobId": job_id, "status": "queued"})
+
+    return await ingest_master_resume(db, current_user["_id"], upload)
+
+@router.get("/resumes/master/jobs/{job_id}")
+async def get_master_resume_job(job_id: str, current_user: User = Depends(get_current_user), db = Depends(get_db)):
+    job = await jobs.get_job(db, current_user["_id"], job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "id": job["_id"],
+        "status": job["status"],
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "createdAt": job.get("createdAt"),
+        "updatedAt": job.get("updatedAt"),
     }
 
-    result = resumes_collection.update_one(
-        {"userId": current_user["_id"], "isMaster": True},
-        {"$set": resume_data},
-        upsert=True
-    )
-    
-    if result.upserted_id or result.modified_count > 0 or result.matched_count > 0:
-        return {"content": {"raw": raw_text, "experience": experience}}
-    else:
-        raise HTTPException(status_code=500, detail="Failed to upload master resume")
+# Every write that changes what the master GETs return increments
+# "revision" and sets "updatedAt"; the pair backs ETag / Last-Modified.
+MASTER_REVISION_PROJECTION = {"revision": 1, "updatedAt": 1}
+
+def master_etag(resume: dict):
+    return f'W/"{resume["_id"]}-{resume.get("revision", 0)}"'
+
+def etag_matches(if_none_match: str, etag: str):
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+def set_revision_headers(response: Response, resume: dict):
+    response.headers["ETag"] = master_etag(resume)
+    response.headers["Cache-Control"] = "private, no-cache"
+    if resume.get("updatedAt"):
+        response.headers["Last-Modified"] = format_datetime(
+            resume["updatedAt"].replace(tzinfo=timezone.utc), usegmt=True
+        )
+
+async def master_not_modified(resumes_collection, user_id, if_none_match: Optional[str]):
+    # Revalidating pollers are answered from the revision alone
+    if not if_none_match:
+        return None
+    resume = await resumes_collection.find_one({"userId": user_id, "isMaster": True}, MASTER_REVISION_PROJECTION)
+    if resume and etag_matches(if_none_match, master_etag(resume)):
+        response = Response(status_code=304)
+        set_revision_headers(response, resume)
+        return response
+    return None
 
 @router.get("/resumes/master")
-async def get_master_resume(current_user: User = Depends(get_current_user)):
-    db = get_db()
+async def get_master_resume(
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
+):
     resumes_collection = db.get_collection("resumes")
+
+    not_modified = await master_not_modified(resumes_collection, current_user["_id"], if_none_match)
+    if not_modified:
+        return not_modified
     
-    resume = resumes_collection.find_one({"userId": current_user["_id"], "isMaster": True})
+    resume = await resumes_collection.find_one(
+        {"userId": current_user["_id"], "isMaster": True},
+        {"content.raw": 1, "content.experience": 1, **MASTER_REVISION_PROJECTION}
+    )
     
     if resume:
-        return {"content": resume.get("content", {})}
+        if "content" not in resume:
+            # The original PUT stored content as a plain string, which the
+            # projection above leaves out
+            legacy = await resumes_collection.find_one({"_id": resume["_id"]}, {"content": 1})
+            if legacy and isinstance(legacy.get("content"), str):
+                resume["content"] = {"raw": legacy["content"]}
+        content = resume.get("content", {})
+        if "raw" in content:
+            content["raw"] = unpack_text(content["raw"])
+        response = ORJSONResponse({"content": content})
+        set_revision_headers(response, resume)
+        return response
     else:
         raise HTTPException(status_code=404, detail="Master resume not found")
 
 @router.get("/resumes/master/experience")
-async def get_master_resume_experience(current_user: User = Depends(get_current_user)):
-    db = get_db()
+async def get_master_resume_experience(
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
+):
     resumes_collection = db.get_collection("resumes")
+
+    not_modified = await master_not_modified(resumes_collection, current_user["_id"], if_none_match)
+    if not_modified:
+        return not_modified
     
-    resume = resumes_collection.find_one({"userId": current_user["_id"], "isMaster": True})
+    resume = await resumes_collection.find_one(
+        {"userId": current_user["_id"], "isMaster": True},
+        {"content.experience": 1, "experienceVersion": 1, **MASTER_REVISION_PROJECTION}
+    )
     
     if resume and "content" in resume and "experience" in resume["content"]:
-        return resume["content"]["experience"]
+        response = ORJSONResponse(resume["content"]["experience"])
+        set_revision_headers(response, resume)
+        response.headers["X-Experience-Version"] = str(resume.get("experienceVersion", 0))
+        return response
     else:
         return []
 
+def experience_version_filter(version: int):
+    # Masters written before experienceVersion existed count as version 0
+    return {"$in": [0, None]} if version == 0 else version
+
 @router.put("/resumes/master/experience/tags")
 async def update_experience_tags(
     request: TagUpdateRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
-    db = get_db()
     resumes_collection = db.get_collection("resumes")
 
-    master_resume = resumes_collection.find_one({"userId": current_user["_id"], "isMaster": True})
+    master_resume = await resumes_collection.find_one(
+        {"userId": current_user["_id"], "isMaster": True},
+        {"content.experience.id": 1, "experienceVersion": 1}
+    )
     if not master_resume:
         raise HTTPException(status_code=404, detail="Master resume not found")
 
-    experience_map = {exp.id: exp for exp in request.experience}
-    
     if "content" not in master_resume or "experience" not in master_resume["content"]:
         raise HTTPException(status_code=404, detail="No experience data found in master resume")
 
-    updated_experience = []
-    for exp in master_resume["content"]["experience"]:
-        if exp["id"] in experience_map:
-            updated_exp = experience_map[exp["id"]]
-            exp["tags"] = updated_exp.tags
-        updated_experience.append(exp)
-
-    result = resumes_collection.update_one(
-        {"userId": current_user["_id"], "isMaster": True},
-        {"$set": {"content.experience": updated_experience}}
+    current_version = master_resume.get("experienceVersion", 0)
+    if request.expectedVersion is not None and request.expectedVersion != current_version:
+        raise HTTPException(status_code=409, detail="Experience was modified by another request")
+
+    known_ids = {exp.get("id") for exp in master_resume["content"]["experience"]}
+    # Later entries for the same id win, as they did when rebuilding the array
+    tags_by_id = {exp.id: exp.tags for exp in request.experience if exp.id in known_ids}
+    if not tags_by_id:
+        return {"message": "Experience tags updated successfully", "experienceVersion": current_version}
+
+    # One positional $set per entry, applied in a single atomic update so
+    # the version check covers all of them.
+    update_fields = {}
+    array_filters = []
+    for position, (experience_id, tags) in enumerate(tags_by_id.items()):
+        update_fields[f"content.experience.$[e{position}].tags"] = tags
+        array_filters.append({f"e{position}.id": experience_id})
+
+    result = await resumes_collection.update_one(
+        {
+            "userId": current_user["_id"],
+            "isMaster": True,
+            "experienceVersion": experience_version_filter(current_version),
+        },
+        {
+            "$set": {**update_fields, "updatedAt": datetime.utcnow()},
+            "$inc": {"experienceVersion": 1, "revision": 1},
+        },
+        array_filters=array_filters,
     )
 
-    if result.modified_count > 0:
-        return {"message": "Experience tags updated successfully"}
-    else:
-        raise HTTPException(status_code=500, detail="Failed to update experience tags")
+    if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="Experience was modified by another request")
+
+    experience_index = experience_index_cache.get((master_resume["_id"], current_version))
+    if experience_index is not None:
+        experience_index_cache.set((master_resume["_id"], current_version + 1), experience_index.with_tags(tags_by_id))
+    return {"message": "Experience tags updated successfully", "experienceVersion": current_version + 1}
 
 from pydantic import BaseModel
 
 class ResumeUpdate(BaseModel):
     content: str
 
+# MongoDB's error code for setting a field inside a value that is not a document
+PATH_NOT_VIABLE = 28
+
 @router.put("/resumes/master")
 async def update_master_resume(
     resume_data: ResumeUpdate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
-    db = get_db()
     resumes_collection = db.get_collection("resumes")
-    
+
+    # Versions reference master text through snapshots, so the raw text is
+    # replaced alongside a fresh snapshot and index; experience is kept.
+    raw_text = resume_data.content
+    content = {"raw": pack_text(raw_text)}
+    if index_is_persisted(raw_text):
+        content["index"] = build_index(raw_text)
+    snapshot_id = await create_snapshot(db, current_user["_id"], raw_text)
     update_data = {
         "userId": current_user["_id"],
         "isMaster": True,
         "name": "Master Resume",
-        "content": resume_data.content,
+        "snapshotId": snapshot_id,
+        "updatedAt": datetime.utcnow(),
     }
-    result = resumes_collection.update_one(
-        {"userId": current_user["_id"], "isMaster": True},
-        {"$set": update_data},
-        upsert=True
-    )
+    # The content no longer comes from the uploaded file
+    unset = {"contentHash": "", "contentType": ""}
+
+    async def write_master(update):
+        return await resumes_collection.find_one_and_update(
+            {"userId": current_user["_id"], "isMaster": True},
+            update,
+            projection={"snapshotId": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
 
-    if result.upserted_id:
+    try:
+        try:
+            previous = await write_master({
+                "$set": {**update_data, **{f"content.{key}": value for key, value in content.items()}},
+                "$inc": {"revision": 1},
+                "$unset": {**unset, **({} if "index" in content else {"content.index": ""})},
+            })
+        except OperationFailure as e:
+            # The original PUT stored content as a plain string, which has no
+            # fields to set; such a master has no experience to keep either.
+            if e.code != PATH_NOT_VIABLE:
+                raise
+            previous = await write_master({
+                "$set": {**update_data, "content": content}, "$inc": {"revision": 1}, "$unset": unset,
+            })
+    except Exception:
+        await discard_snapshot(db, snapshot_id)
+        raise
+
+    if previous is None:
         return {"message": "Master resume created successfully"}
-    elif result.modified_count > 0 or result.matched_count > 0:
-        return {"message": "Master resume updated successfully"}
-    else:
-        raise HTTPException(status_code=500, detail="Failed to update master resume")
+    await release_snapshot(db, current_user["_id"], previous.get("snapshotId"))
+    return {"message": "Master resume updated successfully"}
 
-@router.post("/resumes/versions")
-async def create_resume_version(
-    request: ResumeVersionRequest,
-    current_user: User = Depends(get_current_user)
-):
-    db = get_db()
-    resumes_collection = db.get_collection("resumes")
+def generate_version_ops(master_index: dict, job_description: str):
+    ranked_lines = rank_lines(master_index, job_description)
+    
+    # If no lines match, we can return the whole master resume content as a fallback
+    if not ranked_lines:
+        return None
 
-    # 1. Check subscription tier and limit versions for free users
-    if current_user.get("subscription") == "free":
-        version_count = resumes_collection.count_documents({"userId": current_user["_id"], "isMaster": False})
-        if version_count >= 2:
-            raise HTTPException(status_code=403, detail="Free users are limited to 2 resume versions. Please upgrade to create more.")
+    return encode_line_numbers(ranked_lines)
 
-    # 2. Fetch the master resume
-    master_resume = resumes_collection.find_one({"userId": current_user["_id"], "isMaster": True})
+async def load_master_for_generation(db, user_id):
+    resumes_collection = db.get_collection("resumes")
+    master_resume = await resumes_collection.find_one(
+        {"userId": user_id, "isMaster": True},
+        {"userId": 1, "snapshotId": 1, "experienceVersion": 1, "content.index": 1}
+    )
     if not master_resume:
         raise HTTPException(status_code=404, detail="Master resume not found. Please upload one first.")
 
-    master_content = master_resume.get("content", {}).get("raw", "")
+    # The text comes from the (cached) snapshot rather than the master document
+    if not master_resume.get("snapshotId"):
+        master_resume = await resumes_collection.find_one(
+            {"_id": master_resume["_id"]}, {"userId": 1, "content.raw": 1, "content.index": 1}
+        )
+    snapshot_id = await ensure_master_snapshot(db, master_resume)
+    master_content, master_lines = await get_snapshot(db, snapshot_id)
     if not master_content:
         raise HTTPException(status_code=404, detail="Master resume content is empty.")
 
-    # 2. Simplified generation logic (keyword filtering)
-    job_keywords = set(request.jobDescription.lower().split())
-    
-    # A simple way to filter might be to check for sentences containing keywords.
-    # This is a placeholder for the more complex logic that will be developed.
-    generated_content_lines = [
-        line for line in master_content.splitlines()
-        if any(keyword in line.lower() for keyword in job_keywords)
-    ]
-    
-    # If no lines match, we can return the whole master resume content as a fallback
-    if not generated_content_lines:
-        generated_content = master_content
-    else:
-        generated_content = "\n".join(generated_content_lines)
+    master_index = master_resume.get("content", {}).get("index")
+    if not master_index:
+        master_index = master_index_cache.get(snapshot_id)
+        if master_index is None:
+            master_index = build_index(master_content)
+            master_index_cache.set(snapshot_id, master_index)
+    experience_index = await get_experience_index(db, master_resume)
+    return master_content, master_lines, master_index, snapshot_id, experience_index
+
+def generate_version(master_content: str, master_lines, master_index: dict, job_description: str):
+    ops = generate_version_ops(master_index, job_description)
+    return ops, apply_delta(master_content, master_lines, ops)
+
+@router.post(
+    "/resumes/versions",
+    dependencies=[Depends(user_rate_limit("generate")), Depends(generate_concurrency)],
+)
+async def create_resume_version(
+    request: ResumeVersionRequest,
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    resumes_collection = db.get_collection("resumes")
 
+    # 1. Claim a slot on the user's version counter; fails once their tier's limit is reached
+    if not await reserve_versions(db, current_user, 1):
+        raise HTTPException(status_code=403, detail=quota_exceeded_detail(current_user.get("subscription", "free")))
 
-    # 3. Save the new version to the database
-    new_version = {
-        "userId": current_user["_id"],
-        "isMaster": False,
-        "name": request.versionName,
-        "content": {"raw": generated_content},
-    }
-    result = resumes_collection.insert_one(new_version)
+    try:
+        # 2. Fetch the master resume
+        master_content, master_lines, master_index, snapshot_id, experience_index = await load_master_for_generation(db, current_user["_id"])
+
+        # 3. Rank master lines and experience entries against the job description
+        with span("version_generation"):
+            ops, generated_content = generate_version(master_content, master_lines, master_index, request.jobDescription)
+        with span("experience_scoring"):
+            experience = experience_index.rank([request.jobDescription])[0]
+
+        # 4. Save the new version to the database as a delta against the master snapshot
+        new_version = {
+            "userId": current_user["_id"],
+            "isMaster": False,
+            "name": request.versionName,
+            "content": make_delta(snapshot_id, ops),
+            "experience": experience,
+        }
+        result = await resumes_collection.insert_one(new_version)
+    except Exception:
+        # No version was saved, so give the slot back
+        await release_versions(db, current_user["_id"], 1)
+        raise
+    await retain_snapshot(db, current_user["_id"], snapshot_id, master_content)
 
-    # 4. Return the new version
+    # 5. Return the new version
     if result.inserted_id:
-        return {
+        return ORJSONResponse({
             "id": str(result.inserted_id),
             "name": request.versionName,
             "content": {"raw": generated_content},
-        }
+            "experience": experience,
+        })
     else:
         raise HTTPException(status_code=500, detail="Failed to create resume version")
 
+@router.post("/resumes/versions:batch", dependencies=[Depends(generate_concurrency)])
+async def create_resume_versions_batch(
+    request: ResumeVersionBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    resumes_collection = db.get_collection("resumes")
+    items = request.versions
+
+    # Each item counts against the same budget as a single generation
+    await check_user_rate_limit("generate", current_user, cost=len(items))
+    results = [None] * len(items)
+
+    # 1. Claim version slots for as many items as the tier allows; items past it are rejected individually
+    granted = await reserve_versions(db, current_user, len(items))
+    accepted = list(range(granted))
+    for position in range(granted, len(items)):
+        detail = quota_exceeded_detail(current_user.get("subscription", "free"))
+        results[position] = {"index": position, "error": {"status": 403, "detail": detail}}
+
+    # 2. Fetch the master resume and its index once for the whole batch
+    try:
+        master_content, master_lines, master_index, snapshot_id, experience_index = await load_master_for_generation(db, current_user["_id"])
+    except Exception:
+        await release_versions(db, current_user["_id"], granted)
+        raise
+
+    def generate_batch():
+        generated = []
+        with span("version_generation"):
+            for position in accepted:
+                try:
+                    generated.append(generate_version(master_content, master_lines, master_index, items[position].jobDescription))
+                except Exception as e:
+                    generated.append(e)
+
+        # Every job description is scored against the experience matrix at once
+        with span("experience_scoring"):
+            rankings = experience_index.rank([items[position].jobDescription for position in accepted])
+        return generated, rankings
+
+    try:
+        # 3. Generate every accepted version. The work is CPU-bound, so it gains
+        # no parallelism from threads; it is offloaded in one call only so the
+        # event loop keeps serving other requests meanwhile.
+        generated, rankings = await run_in_threadpool(generate_batch)
+
+        new_versions = []
+        for position, outcome, experience in zip(accepted, generated, rankings):
+            if isinstance(outcome, Exception):
+                results[position] = {"index": position, "error": {"status": 500, "detail": f"Failed to generate resume version: {outcome}"}}
+                continue
+            ops, generated_content = outcome
+            new_versions.append((position, generated_content, {
+                "userId": current_user["_id"],
+                "isMaster": False,
+                "name": items[position].versionName,
+                "content": make_delta(snapshot_id, ops),
+                "experience": experience,
+            }))
+
+        # 4. Save them with a single insert_many; pymongo assigns the _ids up front
+        failed = {}
+        if new_versions:
+            try:
+                await resumes_collection.insert_many([document for _, _, document in new_versions], ordered=False)
+            except BulkWriteError as e:
+                failed = {error["index"]: error.get("errmsg", "write failed") for error in e.details.get("writeErrors", [])}
+    except Exception:
+        # Nothing is known to be saved, so give every slot back; any version
+        # that did land is picked up by reconcile_version_counts
+        await release_versions(db, current_user["_id"], granted)
+        raise
+
+    # Slots claimed for items that were not saved are given back
+    await release_versions(db, current_user["_id"], granted - (len(new_versions) - len(failed)))
+    if len(new_versions) > len(failed):
+        await retain_snapshot(db, current_user["_id"], snapshot_id, master_content)
+
+    for offset, (position, generated_content, document) in enumerate(new_versions):
+        if offset in failed:
+            results[position] = {"index": position, "error": {"status": 500, "detail": f"Failed to create resume version: {failed[offset]}"}}
+        else:
+            results[position] = {
+                "index": position,
+                "id": str(document["_id"]),
+                "name": document["name"],
+                "content": {"raw": generated_content},
+                "experience": document["experience"],
+            }
+
+    return ORJSONResponse({"results": results})
+
+VERSION_SUMMARY_PROJECTION = {"name": 1, "createdAt": 1, "lastModified": 1}
+
+def parse_version_id(version_id: str):
+    try:
+        return ObjectId(version_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid version ID")
+
+def version_summary(version):
+    return {
+        "id": str(version["_id"]),
+        "name": version.get("name"),
+        "createdAt": version.get("createdAt"),
+        "lastModified": version.get("lastModified")
+    }
+
 @router.get("/resumes/versions")
-async def get_resume_versions(current_user: User = Depends(get_current_user)):
-    db = get_db()
+async def get_resume_versions(
+    limit: int = Query(20, ge=1, le=100),
+    after: str | None = Query(None),
+    include: str | None = Query(None),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
+):
     resumes_collection = db.get_collection("resumes")
-    
-    versions_cursor = resumes_collection.find({
-        "userId": current_user["_id"],
-        "isMaster": False
-    })
+
+    query = {"userId": current_user["_id"], "isMaster": False}
+    total = await resumes_collection.count_documents(query)
+
+    if after:
+        query["_id"] = {"$gt": parse_version_id(after)}
+
+    # Summaries only unless the caller opts in to the (potentially large) bodies
+    include_content = include == "content"
+    projection = None if include_content else VERSION_SUMMARY_PROJECTION
+    versions_cursor = resumes_collection.find(query, projection).sort("_id", 1).limit(limit)
     
     versions = []
-    for version in versions_cursor:
-        versions.append({
-            "id": str(version["_id"]),
-            "name": version.get("name"),
-            "content": version.get("content", {}),
-            "createdAt": version.get("createdAt"),
-            "lastModified": version.get("lastModified")
-        })
-        
+    async for version in versions_cursor:
+        summary = version_summary(version)
+        if include_content:
+            # One version whose snapshot is gone should not fail the whole page
+            try:
+                summary["content"] = await materialize_content(db, version.get("content", {}))
+            except HTTPException as e:
+                if e.status_code != 410:
+                    raise
+                summary["content"] = None
+                summary["error"] = {"status": e.status_code, "detail": e.detail}
+        versions.append(summary)
+
+    response = ORJSONResponse(versions)
+    response.headers["X-Total-Count"] = str(total)
+    if len(versions) == limit:
+        response.headers["X-Next-Cursor"] = versions[-1]["id"]
+    return response
+
+@router.get("/resumes/versions/{version_id}")
+async def get_resume_version(
+    version_id: str,
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    resumes_collection = db.get_collection("resumes")
 
-from bson import ObjectId
+    version = await resumes_collection.find_one(
+        {"_id": parse_version_id(version_id), "userId": current_user["_id"], "isMaster": False},
+        {**VERSION_SUMMARY_PROJECTION, "content": 1, "experience": 1}
+    )
+    if not version:
+        raise HTTPException(status_code=404, detail="Resume version not found")
+
+    return ORJSONResponse({
+        **version_summary(version),
+        "content": await materialize_content(db, version.get("content", {})),
+        "experience": version.get("experience", []),
+    })
 
 @router.put("/resumes/versions/{version_id}")
 async def update_resume_version(
     version_id: str,
     resume_data: ResumeUpdate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
-    db = get_db()
     resumes_collection = db.get_collection("resumes")
     
-    try:
-        oid = ObjectId(version_id)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid version ID")
+    oid = parse_version_id(version_id)
 
-    result = resumes_collection.update_one(
-        {"_id": oid, "userId": current_user["_id"]},
-        {"$set": {"content": {"raw": resume_data.content}, "lastModified": ""}}
+    content = {"raw": resume_data.content}
+    snapshot_id = await load_master_snapshot_id(db, current_user["_id"])
+    if snapshot_id:
+        raw_text, master_lines = await get_snapshot(db, snapshot_id)
+        content = encode_content(snapshot_id, raw_text, master_lines, resume_data.content)
+
+    result = await resumes_collection.update_one(
+        {"_id": oid, "userId": current_user["_id"], "isMaster": False},
+        {"$set": {"content": content, "lastModified": ""}}
     )
 
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Resume version not found")
+    if "delta" in content:
+        await retain_snapshot(db, current_user["_id"], snapshot_id, raw_text)
 
 @router.post("/resumes/versions/{version_id}/sync")
 async def sync_resume_version(
     version_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
-    db = get_db()
     resumes_collection = db.get_collection("resumes")
 
-    # 1. Fetch the master resume
-    master_resume = resumes_collection.find_one({"userId": current_user["_id"], "isMaster": True})
-    if not master_resume:
+    # 1. Fetch the master resume's current snapshot
+    snapshot_id = await load_master_snapshot_id(db, current_user["_id"])
+    if not snapshot_id:
         raise HTTPException(status_code=404, detail="Master resume not found. Please upload one first.")
 
-    master_content = master_resume.get("content", {}).get("raw", "")
+    master_content, _ = await get_snapshot(db, snapshot_id)
     if not master_content:
         raise HTTPException(status_code=404, detail="Master resume content is empty.")
 
-    # 2. Update the version with the master content
-    try:
-        oid = ObjectId(version_id)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid version ID")
+    # 2. Point the version at the whole snapshot
+    oid = parse_version_id(version_id)
 
-    result = resumes_collection.update_one(
-        {"_id": oid, "userId": current_user["_id"]},
-        {"$set": {"content": {"raw": master_content}, "masterLastSynced": ""}}
+    result = await resumes_collection.update_one(
+        {"_id": oid, "userId": current_user["_id"], "isMaster": False},
+        {"$set": {"content": make_delta(snapshot_id, None), "masterLastSynced": ""}}
     )
 
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Resume version not found")
+    await retain_snapshot(db, current_user["_id"], snapshot_id, master_content)
 
     return {"message": "Resume version synced successfully"}
     
@@ -0,0 +1,69 @@
+import argparse
+import os
+import uvicorn
+from settings import get_settings
+
+# Production entry point. Each worker is a separate process with its own
+# Mongo pool, caches and ingestion queue; uvicorn's lifespan shutdown runs
+# main.shutdown_db_client in every worker on SIGTERM/SIGINT, after in-flight
+# requests have finished or the graceful timeout has passed.
+#
+#     python serve.py --workers 4 --port 8001
+
+def default_workers():
+    # PDF extraction runs in its own process pool, so leave headroom
+    # rather than one worker per core.
+    return max(1, (os.cpu_count() or 2) // 2)
+
+def extraction_workers_per_worker(workers: int):
+    # Every API worker starts its own extraction pool; split the cores
+    # between them instead of giving each pool nearly all of them.
+    return max(1, (os.cpu_count() or 2) // workers)
+
+def main():
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Run the Resume Pivot API")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=settings.server_workers or default_workers())
+    parser.add_argument("--backlog", type=int, default=settings.server_backlog,
+                        help="pending connections the listening socket queues")
+    parser.add_argument("--keep-alive", type=int, default=settings.server_keep_alive_seconds,
+                        help="seconds an idle keep-alive connection stays open")
+    parser.add_argument("--graceful-timeout", type=int, default=settings.server_graceful_timeout_seconds,
+                        help="seconds to wait for in-flight requests on shutdown")
+    parser.add_argument("--limit-concurrency", type=int, default=settings.server_limit_concurrency,
+                        help="per-worker cap on concurrent connections before answering 503")
+    parser.add_argument("--max-requests", type=int, default=settings.server_max_requests,
+                        help="restart a worker after this many requests")
+    # "auto" picks uvloop and httptools when they are installed
+    parser.add_argument("--loop", default=settings.server_loop, choices=["auto", "asyncio", "uvloop"])
+    parser.add_argument("--http", default=settings.server_http, choices=["auto", "h11", "httptools"])
+    parser.add_argument("--no-access-log", action="store_true", help="request timings are still exported on /metrics")
+    parser.add_argument("--forwarded-allow-ips", default=settings.forwarded_allow_ips)
+    args = parser.parse_args()
+
+    # Read by each worker's settings; an explicit value (environment or .env,
+    # which get_settings has already loaded) is left alone.
+    os.environ.setdefault("PDF_EXTRACTION_WORKERS", str(extraction_workers_per_worker(args.workers)))
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        limit_concurrency=args.limit_concurrency,
+        limit_max_requests=args.max_requests,
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        access_log=not args.no_access_log,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import Optional, Union, get_args, get_origin
+import os
+import tempfile
+from dotenv import load_dotenv
+
+# All configuration, read once per process from the environment (and .env
+# next to this file, which never overrides variables that are already set).
+# Each field is read from the upper-cased variable of the same name, e.g.
+# pdf_max_pages <- PDF_MAX_PAGES.
+
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+
+JWT_ALGORITHMS = {"HS256", "HS384", "HS512", "RS256", "RS384", "RS512", "ES256", "ES384", "ES512"}
+
+class SettingsError(ValueError):
+    pass
+
+# For a single API process; serve.py sets PDF_EXTRACTION_WORKERS to share the
+# cores between its workers.
+def _default_extraction_workers():
+    return max(1, (os.cpu_count() or 2) - 1)
+
+@dataclass(frozen=True)
+class Settings:
+    mongodb_uri: str = ""
+    jwt_secret_key: str = ""
+    algorithm: str = "HS256"
+    access_token_expire_minutes: int = 60
+    cors_origins: tuple = ("http://localhost:5137",)
+
+    # MongoDB connection pool
+    mongodb_max_pool_size: int = 100
+    mongodb_min_pool_size: int = 0
+    mongodb_max_idle_time_ms: int = 60000
+    mongodb_server_selection_timeout_ms: int = 5000
+
+    # Password hashing and auth caches
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_queue_limit: int = 32
+    user_cache_max_size: int = 10000
+    user_cache_ttl_seconds: float = 30
+    blocklist_cache_max_size: int = 10000
+    blocklist_cache_ttl_seconds: float = 30
+    token_cache_max_size: int = 10000
+    token_cache_ttl_seconds: float = 300
+    blocklist_refresh_seconds: float = 15
+    blocklist_max_staleness_seconds: float = 30
+
+    # Uploads and PDF extraction
+    upload_max_bytes: int = 10 * 1024 * 1024
+    # Only takes effect below Starlette's own 1 MiB upload spool size
+    upload_spool_bytes: int = 1024 * 1024
+    pdf_max_bytes: int = 10 * 1024 * 1024
+    pdf_max_pages: int = 50
+    pdf_extraction_timeout_seconds: float = 30
+    pdf_extraction_workers: int = field(default_factory=_default_extraction_workers)
+    pdf_pages_per_job: int = 8
+
+    # Parsing, tagging and background ingestion
+    parser_max_experience_chars: int = 100000
+    taxonomy_path: Optional[str] = None
+    taxonomy_source: Optional[str] = None
+    taxonomy_reload_seconds: float = 5
+    ingest_workers: int = 2
+    ingest_queue_size: int = 100
+    job_ttl_seconds: int = 24 * 60 * 60
+
+    # Resume storage
+    extraction_cache_max_entries: int = 256
+    extraction_cache_ttl_seconds: float = 3600
+    snapshot_cache_max_entries: int = 512
+    snapshot_cache_ttl_seconds: float = 600
+    index_persist_max_bytes: int = 512 * 1024
+    master_index_cache_max_entries: int = 64
+    master_index_cache_ttl_seconds: float = 600
+    raw_text_compress_bytes: int = 4096
+    raw_text_compress_level: int = 6
+
+    # Resume versions each subscription tier may keep, as tier:limit pairs
+    # (e.g. "free:2,pro:50"). Tiers not listed are unlimited.
+    version_limits: tuple = ("free:2",)
+
+    # Experience relevance scoring (experience_scoring.py)
+    experience_ranking_max_entries: int = 10
+    experience_index_cache_max_entries: int = 512
+    experience_index_cache_ttl_seconds: float = 600
+
+    # Rate limiting and admission control (ratelimit.py). Limits are per
+    # user (per client IP for login/register) and apply to the free tier;
+    # other tiers get rate_limit_paid_multiplier times as much.
+    rate_limit_enabled: bool = True
+    rate_limit_store: str = "memory"
+    rate_limit_sqlite_path: str = os.path.join(tempfile.gettempdir(), "resume-pivot-ratelimit.sqlite3")
+    rate_limit_upload_per_minute: float = 6
+    rate_limit_generate_per_minute: float = 30
+    rate_limit_login_per_minute: float = 10
+    rate_limit_register_per_minute: float = 5
+    rate_limit_paid_multiplier: float = 5
+    upload_concurrency: int = 4
+    generate_concurrency: int = 16
+    concurrency_wait_seconds: float = 2
+
+    # Diagnostics (profiling.py). ADMIN_TOKEN guards the /admin endpoints and
+    # per-request profiling; both are off while it is empty.
+    admin_token: str = ""
+    profiling_enabled: bool = False
+    profiling_interval_seconds: float = 0.005
+    profiling_max_seconds: float = 30
+    profiling_max_profiles: int = 20
+    slow_request_sample_rate: float = 0
+    slow_request_per_route: int = 10
+
+    # serve.py
+    server_host: str = "0.0.0.0"
+    server_port: int = 8001
+    server_workers: Optional[int] = None
+    server_backlog: int = 2048
+    server_keep_alive_seconds: int = 15
+    server_graceful_timeout_seconds: int = 30
+    server_limit_concurrency: Optional[int] = None
+    server_max_requests: Optional[int] = None
+    server_loop: str = "auto"
+    server_http: str = "auto"
+    forwarded_allow_ips: str = "127.0.0.1"
+
+    @classmethod
+    def from_env(cls, environ):
+        values = {}
+        errors = []
+        for setting in fields(cls):
+            raw = environ.get(setting.name.upper())
+            if raw is None or raw.strip() == "":
+                continue
+            try:
+                values[setting.name] = _parse(raw.strip(), setting.type)
+            except ValueError:
+                errors.append(f"{setting.name.upper()}={raw!r} is not a valid {_type_name(setting.type)}")
+        if errors:
+            raise SettingsError("Invalid settings: " + "; ".join(errors))
+        settings = cls(**values)
+        settings.validate()
+        return settings
+
+    def validate(self):
+        errors = []
+        for setting in fields(self):
+            value = getattr(self, setting.name)
+            if isinstance(value, (int, float)) and value < 0:
+                errors.append(f"{setting.name.upper()} must not be negative")
+
+        must_be_positive = [
+            "access_token_expire_minutes", "mongodb_max_pool_size", "password_hash_workers",
+            "user_cache_max_size", "blocklist_cache_max_size", "token_cache_max_size",
+            "upload_max_bytes", "pdf_max_bytes", "pdf_max_pages", "pdf_extraction_timeout_seconds",
+            "pdf_extraction_workers", "pdf_pages_per_job", "ingest_workers", "ingest_queue_size",
+            "extraction_cache_max_entries", "snapshot_cache_max_entries", "master_index_cache_max_entries", "server_port",
+            "rate_limit_upload_per_minute", "rate_limit_generate_per_minute", "rate_limit_login_per_minute",
+            "rate_limit_register_per_minute", "rate_limit_paid_multiplier", "upload_concurrency",
+            "generate_concurrency", "experience_ranking_max_entries", "profiling_interval_seconds",
+            "profiling_max_seconds", "profiling_max_profiles", "slow_request_per_route",
+        ]
+        for name in must_be_positive:
+            if getattr(self, name) == 0:
+                errors.append(f"{name.upper()} must be greater than 0")
+
+        if self.algorithm not in JWT_ALGORITHMS:
+            errors.append(f"ALGORITHM must be one of {', '.join(sorted(JWT_ALGORITHMS))}")
+        if not 4 <= self.bcrypt_rounds <= 31:
+            errors.append("BCRYPT_ROUNDS must be between 4 and 31")
+        if self.mongodb_min_pool_size > self.mongodb_max_pool_size:
+            errors.append("MONGODB_MIN_POOL_SIZE must not exceed MONGODB_MAX_POOL_SIZE")
+        if not 0 <= self.raw_text_compress_level <= 9:
+            errors.append("RAW_TEXT_COMPRESS_LEVEL must be between 0 and 9")
+        try:
+            self.version_limits_by_tier()
+        except ValueError:
+            errors.append("VERSION_LIMITS must be comma-separated tier:limit pairs with non-negative limits")
+        if self.slow_request_sample_rate > 1:
+            errors.append("SLOW_REQUEST_SAMPLE_RATE must be between 0 and 1")
+        if self.profiling_enabled and not self.admin_token:
+            errors.append("PROFILING_ENABLED requires ADMIN_TOKEN")
+        if self.rate_limit_store not in ("memory", "sqlite"):
+            errors.append("RATE_LIMIT_STORE must be memory or sqlite")
+        if self.server_loop not in ("auto", "asyncio", "uvloop"):
+            errors.append("SERVER_LOOP must be auto, asyncio or uvloop")
+        if self.server_http not in ("auto", "h11", "httptools"):
+            errors.append("SERVER_HTTP must be auto, h11 or httptools")
+        if errors:
+            raise SettingsError("Invalid settings: " + "; ".join(errors))
+
+    def version_limits_by_tier(self):
+        limits = {}
+        for pair in self.version_limits:
+            tier, _, limit = pair.rpartition(":")
+            if not tier.strip() or int(limit) < 0:
+                raise ValueError(pair)
+            limits[tier.strip()] = int(limit)
+        return limits
+
+    def require(self, *names):
+        # Secrets and connection strings are only needed by the API process,
+        # not by benchmarks or tooling that import its modules.
+        missing = [name.upper() for name in names if not getattr(self, name)]
+        if missing:
+            raise SettingsError(f"{', '.join(missing)} not found in environment variables or .env file")
+
+def _unwrap_optional(annotation):
+    if get_origin(annotation) is Union:
+        return next(arg for arg in get_args(annotation) if arg is not type(None))
+    return annotation
+
+def _type_name(annotation):
+    return _unwrap_optional(annotation).__name__
+
+def _parse(raw: str, annotation):
+    target = _unwrap_optional(annotation)
+    if target is tuple:
+        return tuple(part.strip() for part in raw.split(",") if part.strip())
+    if target is bool:
+        if raw.lower() in ("1", "true", "yes", "on"):
+            return True
+        if raw.lower() in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(raw)
+    return target(raw)
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    if os.path.exists(ENV_FILE):
+        load_dotenv(ENV_FILE)
+    return Settings.from_env(os.environ)
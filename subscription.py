@@ -1,24 +1,118 @@
 from fastapi import APIRouter, Depends, HTTPException
-from pymongo import MongoClient
-import os
-from auth import get_current_user
+from pymongo import UpdateOne
+from auth import get_current_user, invalidate_user
+from database import get_db
 from models import User, SubscriptionUpgradeRequest
+from settings import get_settings
 
 router = APIRouter()
 
-def get_db():
-    client = MongoClient(os.getenv("MONGODB_URI"))
-    db = client.get_database("resume_pivot")
-    return db
+# Resume versions per subscription tier; tiers not listed are unlimited.
+VERSION_LIMITS = get_settings().version_limits_by_tier()
+
+# Each user document keeps a versionCount of the resume versions they own.
+# Creating a version first claims a slot on it with a filtered $inc, so the
+# quota check is one atomic update on the user's _id and two concurrent
+# requests cannot both take the last slot.
+
+def version_limit(tier: str):
+    return VERSION_LIMITS.get(tier)
+
+def quota_exceeded_detail(tier: str):
+    return f"{tier.capitalize()} users are limited to {version_limit(tier)} resume versions. Please upgrade to create more."
+
+async def initialize_version_count(db, user_id):
+    # Users created before the counter existed get it from their versions once
+    version_count = await db.get_collection("resumes").count_documents({"userId": user_id, "isMaster": False})
+    await db.get_collection("users").update_one(
+        {"_id": user_id, "versionCount": {"$exists": False}},
+        {"$set": {"versionCount": version_count}},
+    )
+
+async def reserve_versions(db, current_user, requested: int):
+    # Claims up to `requested` slots and returns how many were granted
+    users_collection = db.get_collection("users")
+    user_id = current_user["_id"]
+    limit = version_limit(current_user.get("subscription", "free"))
+
+    if limit is None:
+        # Still counted, so the quota is right if the user later downgrades
+        for _ in range(2):
+            result = await users_collection.update_one(
+                {"_id": user_id, "versionCount": {"$exists": True}},
+                {"$inc": {"versionCount": requested}},
+            )
+            if result.matched_count:
+                return requested
+            await initialize_version_count(db, user_id)
+        return 0
+
+    # Optimistically ask for everything; on a miss, re-read the counter and
+    # ask for what is left. A single version is one update when under quota.
+    granted = min(requested, limit)
+    for _ in range(5):
+        if granted <= 0:
+            return 0
+        result = await users_collection.update_one(
+            {"_id": user_id, "versionCount": {"$lte": limit - granted}},
+            {"$inc": {"versionCount": granted}},
+        )
+        if result.matched_count:
+            return granted
+
+        user = await users_collection.find_one({"_id": user_id}, {"versionCount": 1})
+        if user is None:
+            return 0
+        if "versionCount" not in user:
+            await initialize_version_count(db, user_id)
+            continue
+        granted = min(requested, limit - user["versionCount"])
+    return 0
+
+async def release_versions(db, user_id, count: int):
+    # Gives back slots claimed for versions that were not saved
+    if count > 0:
+        await db.get_collection("users").update_one(
+            {"_id": user_id, "versionCount": {"$gte": count}},
+            {"$inc": {"versionCount": -count}},
+        )
+
+async def reconcile_version_counts(db, dry_run: bool = False):
+    # Repairs counters that drifted from the versions actually stored, e.g.
+    # after a worker died between claiming a slot and saving the version.
+    # Counters are read before counting, and only written back if they have
+    # not moved since, so versions created meanwhile are not lost.
+    users_collection = db.get_collection("users")
+    stored = {user["_id"]: user.get("versionCount") async for user in users_collection.find({}, {"versionCount": 1})}
+
+    actual = {}
+    cursor = await db.get_collection("resumes").aggregate([
+        {"$match": {"isMaster": False}},
+        {"$group": {"_id": "$userId", "count": {"$sum": 1}}},
+    ])
+    async for row in cursor:
+        actual[row["_id"]] = row["count"]
+
+    repairs = [
+        UpdateOne({"_id": user_id, "versionCount": version_count}, {"$set": {"versionCount": actual.get(user_id, 0)}})
+        for user_id, version_count in stored.items()
+        if version_count != actual.get(user_id, 0)
+    ]
+    repaired = 0
+    if not dry_run:
+        for start in range(0, len(repairs), 1000):
+            result = await users_collection.bulk_write(repairs[start:start + 1000], ordered=False)
+            repaired += result.modified_count
+    return {"checked": len(stored), "drifted": len(repairs), "repaired": repaired}
 
 @router.post("/subscriptions/upgrade")
 async def upgrade_subscription(
-    request: SubscriptionUpgradeRequest, current_user: User = Depends(get_current_user)
+    request: SubscriptionUpgradeRequest, current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
-    db = get_db()
     users_collection = db.get_collection("users")
 
-    result = users_collection.update_one(
+    result = await users_collection.update_one(
         {"_id": current_user["_id"]},
         {"$set": {"subscription": request.tierId}},
     )
@@ -26,4 +120,6 @@ async def upgrade_subscription(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return {"message": "Subscription upgraded successfully"}
\ No newline at end of file
+    invalidate_user(current_user["email"])
+
+    return {"message": "Subscription upgraded successfully"}
@@ -0,0 +1,160 @@
+from collections import deque
+import asyncio
+import json
+import logging
+import os
+import time
+from settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Output field -> label -> keywords. Labels are emitted in the order given.
+DEFAULT_TAXONOMY = {
+    "functionalRoles": {
+        "Software Engineering": ["python", "backend", "api", "developer", "software"],
+        "Product Management": ["product", "roadmap", "feature", "agile"]
+    },
+    "industryDomains": {
+        "E-commerce": ["e-commerce", "inventory", "payment"],
+        "Fintech": ["fintech", "payment", "financial"]
+    },
+}
+
+settings = get_settings()
+TAXONOMY_PATH = settings.taxonomy_path
+TAXONOMY_RELOAD_SECONDS = settings.taxonomy_reload_seconds
+
+# Aho-Corasick automaton: one pass over the text reports every keyword that
+# occurs in it as a substring.
+class KeywordAutomaton:
+    def __init__(self, keywords):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [frozenset()]
+
+        for keyword in keywords:
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(frozenset())
+                state = next_state
+            self._out[state] = self._out[state] | {keyword}
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] | self._out[self._fail[next_state]]
+
+    def find(self, text: str):
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+class Taxonomy:
+    def __init__(self, categories: dict):
+        self.categories = {
+            field: {label: list(keywords) for label, keywords in labels.items()}
+            for field, labels in categories.items()
+        }
+        self._automaton = KeywordAutomaton(
+            keyword
+            for labels in self.categories.values()
+            for keywords in labels.values()
+            for keyword in keywords
+        )
+
+    def tag(self, lowered_text: str):
+        found = self._automaton.find(lowered_text)
+        return {
+            field: [label for label, keywords in labels.items() if any(k in found for k in keywords)]
+            for field, labels in self.categories.items()
+        }
+
+_taxonomy = Taxonomy(DEFAULT_TAXONOMY)
+_taxonomy_mtime = None
+_last_checked = 0.0
+_db_reload_task = None
+
+# Bumped whenever the keywords change, so results derived from the taxonomy
+# (e.g. the extraction cache) can be keyed on it.
+_taxonomy_version = 0
+
+def set_taxonomy(categories: dict):
+    global _taxonomy, _taxonomy_version
+    taxonomy = Taxonomy(categories)
+    if taxonomy.categories == _taxonomy.categories:
+        return
+    _taxonomy = taxonomy
+    _taxonomy_version += 1
+
+def taxonomy_version():
+    return _taxonomy_version
+
+def _reload_from_file():
+    global _taxonomy_mtime, _last_checked
+    _last_checked = time.monotonic()
+    try:
+        mtime = os.stat(TAXONOMY_PATH).st_mtime
+        if mtime == _taxonomy_mtime:
+            return
+        with open(TAXONOMY_PATH) as f:
+            set_taxonomy(json.load(f))
+        _taxonomy_mtime = mtime
+    except (OSError, ValueError) as e:
+        logger.warning("Could not load taxonomy from %s: %s", TAXONOMY_PATH, e)
+
+def get_taxonomy():
+    if TAXONOMY_PATH and time.monotonic() - _last_checked >= TAXONOMY_RELOAD_SECONDS:
+        _reload_from_file()
+    return _taxonomy
+
+async def load_taxonomy_from_db(db):
+    # Documents look like {"field": "functionalRoles", "label": ..., "keywords": [...]}
+    # and are applied in insertion order.
+    categories = {}
+    async for entry in db.get_collection("taxonomy").find({}).sort("_id", 1):
+        categories.setdefault(entry["field"], {})[entry["label"]] = entry.get("keywords", [])
+    if categories:
+        set_taxonomy(categories)
+
+async def _reload_from_db(db):
+    while True:
+        await asyncio.sleep(TAXONOMY_RELOAD_SECONDS)
+        try:
+            await load_taxonomy_from_db(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Could not reload taxonomy from the database: %s", e)
+
+def start_db_reload(db):
+    global _db_reload_task
+    if TAXONOMY_RELOAD_SECONDS > 0:
+        _db_reload_task = asyncio.create_task(_reload_from_db(db))
+
+async def stop_db_reload():
+    global _db_reload_task
+    if _db_reload_task is not None:
+        _db_reload_task.cancel()
+        await asyncio.gather(_db_reload_task, return_exceptions=True)
+        _db_reload_task = None
@@ -0,0 +1,76 @@
+import re
+import time
+import pytest
+import experience_parser
+from benchmarks.data import synthetic_resume
+
+# The patterns parse_experience used before they were rewritten to avoid
+# backtracking; the rewrite must find exactly the same entries.
+BASELINE_ENTRY_PATTERN = re.compile(
+    r'^\s*([A-Z\s]{2,})\s*\n([\s\S]+?)(?=\n\s*[A-Z\s]{2,}\n|\n\s*(?:Projects|Awards|Additional)\s*\n|\Z)',
+    re.MULTILINE
+)
+BASELINE_ROLE_PATTERN = re.compile(
+    r'^\s*(.*?)\n\s*(.*?–.*?)\n([\s\S]+?)(?=\n\s*[A-Z][a-z].*?\n\s*.*?\–.*?\n|\Z)',
+    re.MULTILINE
+)
+
+HANDWRITTEN_RESUME = """Jane Doe
+Work History
+
+ACME CORP
+Senior Engineer
+Jan 2020 – Present
+Built python backend api services for payment processing.
+  Led the migration to the new inventory system.
+
+Engineer
+2017 – 2019
+Maintained the developer tooling.
+
+GLOBEX
+  Product Manager
+  2015 – 2017
+Owned the product roadmap for fintech features.
+Projects
+Side project
+"""
+
+def parse_with_baseline(monkeypatch, text):
+    with monkeypatch.context() as patch:
+        patch.setattr(experience_parser, "ENTRY_PATTERN", BASELINE_ENTRY_PATTERN)
+        patch.setattr(experience_parser, "ROLE_PATTERN", BASELINE_ROLE_PATTERN)
+        return experience_parser.parse_experience(text)
+
+def without_ids(experience):
+    return [{key: value for key, value in entry.items() if key != "id"} for entry in experience]
+
+@pytest.mark.parametrize("text", [
+    HANDWRITTEN_RESUME,
+    HANDWRITTEN_RESUME.replace("\n", "\r\n"),
+    *(synthetic_resume(roles, seed) for roles in (1, 5, 20) for seed in range(10)),
+])
+def test_matches_baseline_patterns(monkeypatch, text):
+    expected = without_ids(parse_with_baseline(monkeypatch, text))
+    assert without_ids(experience_parser.parse_experience(text)) == expected
+
+def test_handwritten_resume():
+    experience = experience_parser.parse_experience(HANDWRITTEN_RESUME)
+    assert [(entry["company"], entry["title"]) for entry in experience] == [
+        ("ACME CORP", "Senior Engineer"),
+        ("ACME CORP", "Engineer"),
+        ("GLOBEX", "Product Manager"),
+    ]
+
+@pytest.mark.parametrize("text", [
+    "Experience\n" + " " * 100_000 + "x",
+    "Experience\n" + "A " * 50_000 + "x",
+    "Experience\nACME\nx" + " \n" * 50_000 + "y",
+    "Experience\nACME\nx\n" + " " * 100_000 + "y\n",
+    "Experience\nACME\nTitle\nJan – Dec\nx" + "\n \t" * 30_000 + "Ab",
+])
+def test_whitespace_runs_do_not_backtrack(text):
+    # The baseline patterns took minutes on a few thousand spaces
+    started = time.perf_counter()
+    experience_parser.parse_experience(text)
+    assert time.perf_counter() - started < 1
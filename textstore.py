@@ -0,0 +1,23 @@
+from bson import Binary
+import zlib
+from settings import get_settings
+
+# Resume text at or above this many UTF-8 bytes is stored zlib-compressed as
+# BSON binary; shorter text stays a plain string. Readers go through
+# unpack_text so both forms (and documents written before compression) work.
+settings = get_settings()
+RAW_TEXT_COMPRESS_BYTES = settings.raw_text_compress_bytes
+RAW_TEXT_COMPRESS_LEVEL = settings.raw_text_compress_level
+
+def pack_text(text: str):
+    encoded = text.encode("utf-8")
+    if len(encoded) < RAW_TEXT_COMPRESS_BYTES:
+        return text
+    return Binary(zlib.compress(encoded, RAW_TEXT_COMPRESS_LEVEL))
+
+def unpack_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value
@@ -0,0 +1,177 @@
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+import codecs
+import hashlib
+import os
+import tempfile
+from settings import get_settings
+
+settings = get_settings()
+UPLOAD_MAX_BYTES = settings.upload_max_bytes
+# Uploads larger than this are written to a temporary file instead of
+# being kept in memory. Starlette itself rolls uploads over to disk past
+# 1 MiB, so only values below that keep larger uploads off the heap.
+UPLOAD_SPOOL_BYTES = settings.upload_spool_bytes
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+def too_large():
+    return HTTPException(
+        status_code=413,
+        detail=f"Upload exceeds the maximum size of {UPLOAD_MAX_BYTES} bytes.",
+    )
+
+class SpooledUpload:
+    # The uploaded bytes are consumed once: PDFs are kept either in memory
+    # (small) or in a temporary file for PyMuPDF to open by path, text is
+    # decoded and the bytes dropped.
+    def __init__(self, content_type: str):
+        self.content_type = content_type
+        self.size = 0
+        self.content_hash = None
+        self.text = None
+        self.data = None
+        self.path = None
+
+    @property
+    def is_pdf(self):
+        return self.content_type == "application/pdf"
+
+    @property
+    def pdf_source(self):
+        return self.path if self.path is not None else self.data
+
+    def cleanup(self):
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self.data = None
+
+def _spool_bytes(upload: SpooledUpload, data: bytes):
+    upload.size = len(data)
+    if upload.size > UPLOAD_MAX_BYTES:
+        raise too_large()
+    upload.content_hash = hashlib.sha256(data).hexdigest()
+    if not upload.is_pdf:
+        upload.text = data.decode("utf-8")
+    elif upload.size > UPLOAD_SPOOL_BYTES:
+        with tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", delete=False) as spool_file:
+            upload.path = spool_file.name
+            spool_file.write(data)
+    else:
+        upload.data = data
+
+def _spool_file(upload: SpooledUpload, source):
+    # Runs on the threadpool. Starlette's file on disk is anonymous, so the
+    # extraction workers cannot open it by path; PDFs are streamed once into
+    # a named file and text is decoded as it is read.
+    hasher = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder("utf-8")() if not upload.is_pdf else None
+    text_parts = []
+    spool_file = None
+    source.seek(0)
+    try:
+        if decoder is None:
+            spool_file = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", delete=False)
+            upload.path = spool_file.name
+        while chunk := source.read(UPLOAD_CHUNK_BYTES):
+            upload.size += len(chunk)
+            if upload.size > UPLOAD_MAX_BYTES:
+                raise too_large()
+            hasher.update(chunk)
+            if decoder is not None:
+                text_parts.append(decoder.decode(chunk))
+            else:
+                spool_file.write(chunk)
+        if decoder is not None:
+            text_parts.append(decoder.decode(b"", final=True))
+            upload.text = "".join(text_parts)
+    finally:
+        if spool_file is not None:
+            spool_file.close()
+    upload.content_hash = hasher.hexdigest()
+
+async def spool_upload(file: UploadFile):
+    # Starlette has already buffered the upload, in memory while it is small
+    # and in a temporary file once it has grown past its spool size; anything
+    # over our own spool size is streamed from there rather than read whole.
+    if file.size is not None and file.size > UPLOAD_MAX_BYTES:
+        raise too_large()
+    upload = SpooledUpload(file.content_type)
+    try:
+        if file.size is not None and file.size <= UPLOAD_SPOOL_BYTES:
+            await file.seek(0)
+            _spool_bytes(upload, await file.read())
+        else:
+            await run_in_threadpool(_spool_file, upload, file.file)
+    except UnicodeDecodeError:
+        upload.cleanup()
+        raise HTTPException(status_code=400, detail="File is not a valid PDF or plain text file.")
+    except BaseException:
+        upload.cleanup()
+        raise
+    return upload
+
+class UploadTooLarge(Exception):
+    pass
+
+class UploadLimitMiddleware:
+    # Rejects oversized request bodies on the given paths before they are
+    # parsed: up front from Content-Length, or as soon as the streamed body
+    # passes the limit.
+    def __init__(self, app, paths, max_bytes: int = None):
+        self.app = app
+        self.paths = set(paths)
+        # multipart framing adds a little on top of the file itself
+        self.max_bytes = (max_bytes or UPLOAD_MAX_BYTES) + 64 * 1024
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                await self._reject(scope, receive, send)
+                return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise UploadTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            # The body parser reports the abort as a generic error; that
+            # response is dropped in favour of the 413.
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except UploadTooLarge:
+            pass
+        if exceeded and not response_started:
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"Upload exceeds the maximum size of {UPLOAD_MAX_BYTES} bytes."},
+        )
+        await response(scope, receive, send)
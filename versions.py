@@ -0,0 +1,169 @@
+from datetime import datetime
+from fastapi import HTTPException
+from cache import TTLCache
+from settings import get_settings
+from textstore import pack_text, unpack_text
+
+# Versions are stored as a delta against an immutable snapshot of the master
+# resume text:
+#     {"delta": {"snapshotId": ObjectId, "ops": [...] | None}}
+# ops=None means "the whole snapshot". Otherwise each op is a line number
+# into the snapshot, a [start, stop) range of line numbers, or a literal
+# line of text that does not come from the master.
+
+snapshot_cache = TTLCache(
+    maxsize=get_settings().snapshot_cache_max_entries,
+    ttl=get_settings().snapshot_cache_ttl_seconds,
+)
+
+def _cache_snapshot(snapshot_id, raw_text: str):
+    entry = (raw_text, raw_text.splitlines())
+    snapshot_cache.set(snapshot_id, entry)
+    return entry
+
+async def create_snapshot(db, user_id, raw_text: str):
+    result = await db.get_collection("resume_snapshots").insert_one({
+        "userId": user_id,
+        "raw": pack_text(raw_text),
+        "createdAt": datetime.utcnow(),
+    })
+    _cache_snapshot(result.inserted_id, raw_text)
+    return result.inserted_id
+
+async def get_snapshot(db, snapshot_id):
+    entry = snapshot_cache.get(snapshot_id)
+    if entry is None:
+        snapshot = await db.get_collection("resume_snapshots").find_one({"_id": snapshot_id}, {"raw": 1})
+        if snapshot is None:
+            raise HTTPException(
+                status_code=410,
+                detail="The master resume text this content was built from no longer exists. Sync the version with the master resume to restore it.",
+            )
+        entry = _cache_snapshot(snapshot_id, unpack_text(snapshot.get("raw")))
+    return entry
+
+async def discard_snapshot(db, snapshot_id):
+    # For a snapshot whose master write failed, so nothing can reference it
+    await db.get_collection("resume_snapshots").delete_one({"_id": snapshot_id})
+    snapshot_cache.invalidate(snapshot_id)
+
+async def release_snapshot(db, user_id, snapshot_id):
+    # Called once the master has moved to a new snapshot: the old one is
+    # deleted unless one of the user's versions still points at it.
+    if not snapshot_id:
+        return
+    resumes_collection = db.get_collection("resumes")
+    snapshots_collection = db.get_collection("resume_snapshots")
+    referenced = {"userId": user_id, "$or": [{"snapshotId": snapshot_id}, {"content.delta.snapshotId": snapshot_id}]}
+    if await resumes_collection.find_one(referenced, {"_id": 1}):
+        return
+    snapshot = await snapshots_collection.find_one_and_delete({"_id": snapshot_id})
+    # A version generated from the old master may have been saved meanwhile;
+    # one saved after this check is covered by retain_snapshot.
+    if snapshot and await resumes_collection.find_one(referenced, {"_id": 1}):
+        await snapshots_collection.replace_one({"_id": snapshot_id}, snapshot, upsert=True)
+        return
+    snapshot_cache.invalidate(snapshot_id)
+
+async def retain_snapshot(db, user_id, snapshot_id, raw_text: str):
+    # Called after saving a version against snapshot_id. Generation reads the
+    # master's snapshot, works, then writes; if the master was replaced in
+    # between, release_snapshot may already have deleted the snapshot the
+    # version points at, so it is put back from the text still in hand.
+    snapshots_collection = db.get_collection("resume_snapshots")
+    if await snapshots_collection.find_one({"_id": snapshot_id}, {"_id": 1}):
+        return
+    await snapshots_collection.update_one(
+        {"_id": snapshot_id},
+        {"$setOnInsert": {"userId": user_id, "raw": pack_text(raw_text), "createdAt": datetime.utcnow()}},
+        upsert=True,
+    )
+
+async def ensure_master_snapshot(db, master_resume: dict):
+    # Masters written before snapshots existed get one on first use
+    if master_resume.get("snapshotId"):
+        return master_resume["snapshotId"]
+    raw_text = unpack_text(master_resume.get("content", {}).get("raw"))
+    snapshot_id = await create_snapshot(db, master_resume["userId"], raw_text)
+    await db.get_collection("resumes").update_one(
+        {"_id": master_resume["_id"]}, {"$set": {"snapshotId": snapshot_id}}
+    )
+    return snapshot_id
+
+async def load_master_snapshot_id(db, user_id):
+    # The master's raw text is only read for masters that predate snapshots
+    resumes_collection = db.get_collection("resumes")
+    master_resume = await resumes_collection.find_one(
+        {"userId": user_id, "isMaster": True}, {"userId": 1, "snapshotId": 1}
+    )
+    if not master_resume:
+        return None
+    if not master_resume.get("snapshotId"):
+        master_resume = await resumes_collection.find_one(
+            {"_id": master_resume["_id"]}, {"userId": 1, "content.raw": 1}
+        )
+    return await ensure_master_snapshot(db, master_resume)
+
+def encode_line_numbers(line_numbers):
+    ops = []
+    for line_no in line_numbers:
+        last = ops[-1] if ops else None
+        if isinstance(last, int) and last + 1 == line_no:
+            ops[-1] = [last, line_no + 1]
+        elif isinstance(last, list) and last[1] == line_no:
+            last[1] = line_no + 1
+        else:
+            ops.append(line_no)
+    return ops
+
+def encode_text(raw_text: str, master_lines, text: str):
+    if text == raw_text:
+        return None
+    positions = {}
+    for line_no, line in enumerate(master_lines):
+        positions.setdefault(line, line_no)
+
+    ops = []
+    pending = []
+    for line in text.splitlines():
+        line_no = positions.get(line)
+        if line_no is None:
+            ops.extend(encode_line_numbers(pending))
+            pending = []
+            ops.append(line)
+        else:
+            pending.append(line_no)
+    ops.extend(encode_line_numbers(pending))
+    return ops
+
+def apply_delta(raw_text: str, master_lines, ops):
+    if ops is None:
+        return raw_text
+    lines = []
+    for op in ops:
+        if isinstance(op, str):
+            lines.append(op)
+        elif isinstance(op, int):
+            lines.append(master_lines[op])
+        else:
+            lines.extend(master_lines[op[0]:op[1]])
+    return "\n".join(lines)
+
+def make_delta(snapshot_id, ops):
+    return {"delta": {"snapshotId": snapshot_id, "ops": ops}}
+
+def encode_content(snapshot_id, raw_text: str, master_lines, text: str):
+    # Line splitting drops trailing newlines and \r; keep a full copy when
+    # the delta would not reproduce the text exactly.
+    ops = encode_text(raw_text, master_lines, text)
+    if apply_delta(raw_text, master_lines, ops) != text:
+        return {"raw": text}
+    return make_delta(snapshot_id, ops)
+
+async def materialize_content(db, content: dict):
+    # Full-copy documents from before delta storage are returned as they are
+    delta = content.get("delta") if isinstance(content, dict) else None
+    if delta is None:
+        return content
+    raw_text, master_lines = await get_snapshot(db, delta["snapshotId"])
+    return {"raw": apply_delta(raw_text, master_lines, delta["ops"])}